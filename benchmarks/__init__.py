@@ -0,0 +1 @@
+"""Throughput benchmarks run against the local mock store."""
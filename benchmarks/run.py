@@ -0,0 +1,185 @@
+"""Benchmark each stream in each extraction mode against the mock store.
+
+Every (mode, stream) pair is synced in a fresh subprocess, so that peak RSS and
+startup costs are measured per run:
+
+    python -m benchmarks.run --orders 20000 --latency 0.02
+    python -m benchmarks.run --modes sequential keyset --streams orders --json out.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from tap_woo.testing import MockWooServer, MockWooStore
+
+STREAMS = [
+    "products",
+    "product_variations",
+    "orders",
+    "refunds",
+    "subscriptions",
+    "subscription_orders",
+]
+
+MODES = {
+    "sequential": {},
+    "page_concurrency": {"page_concurrency": 4},
+    "time_slices": {"time_slice_days": 30, "time_slice_concurrency": 4},
+    "keyset": {"pagination_mode": "keyset"},
+    "adaptive_page_size": {"adaptive_page_size": True},
+    "child_concurrency": {"child_concurrency": 8},
+    "derived_subscription_orders": {"subscription_orders_mode": "derived"},
+    "bulk_refunds": {"bulk_refunds": True},
+    "streamed_responses": {"stream_responses": True},
+    "project_fields": {"project_fields": True},
+    "fast_output": {"fast_output": True},
+}
+
+BASE_CONFIG = {
+    "consumer_key": "ck_benchmark",
+    "consumer_secret": "cs_benchmark",
+    "start_date": "2022-12-01T00:00:00Z",
+}
+
+# Result key, column header and format of the printed table.
+COLUMNS = [
+    ("mode", "mode", "<28"),
+    ("stream", "stream", "<20"),
+    ("records", "records", ">8"),
+    ("seconds", "seconds", ">8.2f"),
+    ("records_per_second", "rec/s", ">8.0f"),
+    ("records_per_cpu_second", "rec/cpu-s", ">9.0f"),
+    ("requests_per_record", "req/rec", ">8.3f"),
+    ("time_to_first_record", "ttfr (s)", ">8.3f"),
+    ("peak_rss_mb", "rss (MB)", ">8.1f"),
+]
+
+
+def run_worker(url: str, stream_name: str, mode: str) -> dict:
+    """Sync a single stream in this process and return its measurements."""
+    from singer_sdk._singerlib import RecordMessage
+
+    from tap_woo.tap import Tapwoo
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    config = {**BASE_CONFIG, "api_url": url, **MODES[mode]}
+    catalog = Tapwoo(config=config, validate_config=False).catalog_dict
+    for entry in catalog["streams"]:
+        for metadata in entry["metadata"]:
+            if not metadata["breadcrumb"]:
+                metadata["metadata"]["selected"] = entry["tap_stream_id"] == stream_name
+    tap = Tapwoo(config=config, catalog=catalog, validate_config=False)
+
+    records = 0
+    first_record = None
+    write_message = tap.write_message
+
+    def count_records(message) -> None:
+        nonlocal records, first_record
+        if isinstance(message, RecordMessage) and message.stream == stream_name:
+            records += 1
+            if first_record is None:
+                first_record = time.perf_counter()
+        write_message(message)
+
+    tap.write_message = count_records
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        tap.sync_all()
+    finished = time.perf_counter()
+    cpu_seconds = time.process_time() - cpu_started
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return {
+        "records": records,
+        "seconds": finished - started,
+        "cpu_seconds": cpu_seconds,
+        "time_to_first_record": (first_record or finished) - started,
+        "peak_rss_mb": peak_rss / 1024 / 1024,
+    }
+
+
+def run_benchmark(store: MockWooStore, url: str, stream_name: str, mode: str) -> dict:
+    """Run a worker subprocess for one stream and mode."""
+    requests_before = store.request_count
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.run",
+            "--worker",
+            "--url",
+            url,
+            "--streams",
+            stream_name,
+            "--modes",
+            mode,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    requests = store.request_count - requests_before
+    return {
+        "mode": mode,
+        "stream": stream_name,
+        **result,
+        "requests": requests,
+        "records_per_second": result["records"] / result["seconds"],
+        "records_per_cpu_second": result["records"] / result["cpu_seconds"],
+        "requests_per_record": requests / max(result["records"], 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", nargs="+", choices=STREAMS, default=STREAMS)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.url, args.streams[0], args.modes[0])))
+        return
+
+    store = MockWooStore(
+        orders=args.orders,
+        products=args.products,
+        subscriptions=args.subscriptions,
+        latency=args.latency,
+        throttle_every=args.throttle_every,
+    )
+    results = []
+    with MockWooServer(store) as server:
+        print(" ".join(f"{header:{spec.split('.')[0]}}" for _, header, spec in COLUMNS))
+        for mode in args.modes:
+            for stream_name in args.streams:
+                result = run_benchmark(store, server.url, stream_name, mode)
+                results.append(result)
+                print(" ".join(f"{result[key]:{spec}}" for key, _, spec in COLUMNS))
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
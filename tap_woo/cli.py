@@ -0,0 +1,27 @@
+"""Command line entry point of tap-woo."""
+
+from __future__ import annotations
+
+import sys
+
+
+def main() -> None:
+    """Run the tap, answering `--discover` from the catalog cache when possible.
+
+    A cached catalog is printed before the SDK is even imported, which is most
+    of the tap's startup time. Every other invocation goes to `Tapwoo.cli`.
+    """
+    from tap_woo.helpers.discovery import cached_discovery
+
+    catalog_text = cached_discovery(sys.argv[1:])
+    if catalog_text is not None:
+        print(catalog_text)  # noqa: T201
+        return
+
+    from tap_woo.tap import Tapwoo
+
+    Tapwoo.cli()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,84 @@
 
 from __future__ import annotations
 
-from typing import Callable
-from urllib.parse import urljoin, parse_qsl
+import copy
+import time
+from datetime import timedelta
+from pathlib import Path
+from functools import cached_property, partial
+from typing import Callable, Iterable, Optional
+from urllib.parse import ParseResult, urlencode, urljoin, parse_qsl, urlparse
 
 import pendulum
 import requests
 from requests.utils import parse_header_links
+from singer_sdk import metrics
+from singer_sdk._singerlib import RecordMessage
 from singer_sdk.authenticators import BasicAuthenticator
+from singer_sdk.exceptions import RetriableAPIError
+from singer_sdk.helpers._batch import BaseBatchFileEncoding, BatchConfig
+from singer_sdk.helpers._catalog import get_selected_schema
+from singer_sdk.helpers._state import (
+    PROGRESS_MARKERS,
+    STARTING_MARKER,
+    increment_state,
+)
+from singer_sdk.helpers._typing import TypeConformanceLevel
+from singer_sdk.helpers._util import utc_now
 from singer_sdk.pagination import (
     BaseAPIPaginator,
     BaseHATEOASPaginator,
 )  # noqa: TCH002
 from singer_sdk.streams import RESTStream
 
+from tap_woo.helpers.batch import BatchFileWriter
+from tap_woo.helpers.concurrency import ordered_map, ordered_streams
+from tap_woo.helpers.idset import load_ids, missing_ids, save_ids
+from tap_woo.helpers.jsonstream import iter_json_array
+from tap_woo.helpers.metadata import MetaDataFilter
+from tap_woo.helpers.metrics import StreamMetrics, WooMetric
+from tap_woo.helpers.pagesize import PageSizeController
+from tap_woo.helpers.ratelimit import RateLimiter, retry_after_seconds
+from tap_woo.helpers.transform import RecordTransformer
+
 _Auth = Callable[[requests.PreparedRequest], requests.PreparedRequest]
 
 
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Format of the `date_*_gmt` fields returned by the API.
+GMT_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+KEYSET_PAGINATION = "keyset"
+# Size of the chunks read from the socket when streaming responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+# Marks the end of an iterator.
+_END = object()
+# Largest `per_page` accepted by the WooCommerce REST API.
+MAX_PAGE_SIZE = 100
+# Property identifying the store of a record when syncing several stores.
+STORE_ID_PROPERTY = "store_id"
+# State key holding the position of an interrupted sync, see `checkpoint_pages`.
+CHECKPOINT_KEY = "checkpoint"
+# Set on the tombstone records written for deleted records.
+DELETED_AT_PROPERTY = "_sdc_deleted_at"
+# Statuses sent by stores, or the WAFs in front of them, when throttling us.
+THROTTLE_STATUSES = (
+    requests.codes.too_many_requests,
+    requests.codes.service_unavailable,
+)
+
+
+def request_params(request: requests.PreparedRequest) -> dict:
+    """Return the query parameters a request was sent with."""
+    return dict(parse_qsl(urlparse(request.url).query))
 
 
 class WooPaginator(BaseHATEOASPaginator):
+    def __init__(self, start_page: Optional[int] = None) -> None:
+        super().__init__()
+        if start_page and start_page > 1:
+            self._value = self.page_token(start_page)
+
     def get_next_url(self, response):
         links = {
             link.get('rel'): link.get('url')
@@ -29,18 +87,175 @@ class WooPaginator(BaseHATEOASPaginator):
         }
         return links.get('next')
 
+    @staticmethod
+    def page_token(page: int) -> ParseResult:
+        """Return a next page token pointing at the given page number."""
+        return urlparse(f"?page={page}")
+
+
+class WooOffsetPaginator(BaseAPIPaginator):
+    """Paginate with `offset`, so the page size may change between pages."""
+
+    def __init__(self, start_offset: int = 0) -> None:
+        super().__init__(start_offset)
+
+    def get_next(self, response: requests.Response) -> Optional[int]:
+        params = request_params(response.request)
+        per_page = int(params["per_page"])
+        next_offset = int(params.get("offset", 0)) + per_page
+        total = response.headers.get("X-WP-Total")
+        if total is not None and next_offset >= int(total):
+            return None
+        # Proxies and caching plugins may strip the total, a short page still
+        # ends the listing.
+        record_count = getattr(response, "record_count", None)
+        if record_count is None:
+            record_count = len(response.json())
+        if record_count < per_page:
+            return None
+        return next_offset
+
+
+class WooKeysetPaginator(BaseAPIPaginator):
+    """Paginate forward on the replication key instead of page offsets.
+
+    Each token moves `modified_after` up to the last replication key value
+    seen. Since `modified_after` is exclusive and only has second precision,
+    the request starts one second earlier and records sharing the boundary
+    timestamp are told apart by id. A full page of records that all share the
+    boundary timestamp falls back to the next page number for that timestamp.
+    """
+
+    def __init__(self, replication_key: str) -> None:
+        super().__init__(None)
+        self._replication_key = replication_key
+        self._page: list[dict] = []
+        self._cursor: Optional[str] = None
+        self._seen_ids: set = set()
+
+    def consume(self, records: list[dict]) -> list[dict]:
+        """Keep the page just received and return the records not yet emitted."""
+        self._page = records
+        return [
+            record
+            for record in records
+            if not (
+                record[self._replication_key] == self._cursor
+                and record["id"] in self._seen_ids
+            )
+        ]
+
+    def get_next(self, response: requests.Response) -> Optional[dict]:
+        page_size = int(request_params(response.request)["per_page"])
+        if len(self._page) < page_size:
+            return None
+
+        last_value = self._page[-1][self._replication_key]
+        page_ids = {
+            record["id"]
+            for record in self._page
+            if record[self._replication_key] == last_value
+        }
+        modified_after = pendulum.parse(last_value) - timedelta(seconds=1)
+        token = {"modified_after": modified_after.strftime(DATETIME_FORMAT)}
+        if last_value == self._cursor:
+            # Keep the page size while paging through a single timestamp.
+            self._seen_ids |= page_ids
+            token["page"] = self.current_value["page"] + 1
+            token["per_page"] = page_size
+        else:
+            self._cursor = last_value
+            self._seen_ids = page_ids
+            token["page"] = 1
+        return token
+
 
 class wooStream(RESTStream):
     """woo stream class."""
 
+    # Whether the stream can be extracted in `modified_after` time slices.
+    supports_time_slicing = False
+    # Whether deleted records can be detected by sweeping ids, see `sweep_deleted_records`.
+    supports_deletion_sweep = False
+    page_size = 100
+    # Requests avoided because the parent record showed there was nothing to fetch.
+    skipped_request_count = 0
+    # Payload fields the tap needs even when they are not selected.
+    required_fields: tuple[str, ...] = ("id",)
+    # Payload fields read by `get_child_context` and `generate_child_contexts`.
+    child_context_fields: tuple[str, ...] = ()
+    # Meta keys the tap reads, kept whatever the stream's `meta_data_filters`.
+    required_meta_keys: tuple[str, ...] = ()
+    # Records fetched ahead of time by the parent stream, see `_sync_children`.
+    _prefetched_records: Optional[list] = None
+    # The store extracted by this instance, see `bind_store`.
+    store_id: Optional[str] = None
+    # The file BATCH records are currently written to, see `get_batches`.
+    _batch_writer: Optional[BatchFileWriter] = None
+    # State update waiting for the last record of its page, see `_checkpointed`.
+    _pending_checkpoint: Optional[Callable[[], None]] = None
+    # Whether STATE messages wait for the parent's `_sync_pending_children`.
+    _holding_state_messages = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._pending_child_contexts: list[dict] = []
+        # Records whose state increment waits for their queued children.
+        self._pending_increments: list[tuple[dict, Optional[dict]]] = []
+        if self.config.get("stores"):
+            # Records of every store share the stream, so they carry their store.
+            self.schema = {
+                **self.schema,
+                "properties": {
+                    **self.schema["properties"],
+                    STORE_ID_PROPERTY: {"type": ["string", "null"]},
+                },
+            }
+            self.primary_keys = [*(self.primary_keys or []), STORE_ID_PROPERTY]
+        if self.deletion_sweep:
+            # Tombstones of deleted records carry their deletion time.
+            self.schema = {
+                **self.schema,
+                "properties": {
+                    **self.schema["properties"],
+                    DELETED_AT_PROPERTY: {
+                        "type": ["string", "null"],
+                        "format": "date-time",
+                    },
+                },
+            }
+
+    def bind_store(self, store: dict) -> None:
+        """Extract a single store of the `stores` setting.
+
+        The store's settings take precedence over the tap's, and the stream's
+        state is partitioned by store.
+        """
+        self.store_id = store[STORE_ID_PROPERTY]
+        self._config = {**self._config, **store}
+        if self.state_partitioning_keys == []:
+            self.state_partitioning_keys = [STORE_ID_PROPERTY]
+
+    @property
+    def partitions(self) -> Optional[list[dict]]:
+        """Return one partition for the bound store, if any."""
+        if self.store_id is not None and not self.parent_stream_type:
+            return [{STORE_ID_PROPERTY: self.store_id}]
+        return super().partitions
+
     @property
     def url_base(self) -> str:
         """Return the API URL root, configurable via tap settings."""
         return urljoin(self.config["api_url"], 'wp-json/wc/v3')
 
     @property
+    def requests_session(self) -> requests.Session:
+        """Return the session shared by all streams of the same store."""
+        return self._tap.get_session(self.store_id)
+
+    @cached_property
     def authenticator(self) -> BasicAuthenticator:
-        """Return a new authenticator object.
+        """Return the stream's authenticator, built once.
 
         Returns:
             An authenticator instance.
@@ -53,27 +268,897 @@ class wooStream(RESTStream):
 
     def get_url_params(self, context, next_page_token):
         self.logger.debug(f"Next page token: {next_page_token}")
-        params = {"per_page": 100, "order": "asc"}
-        starting_date = self.get_starting_timestamp(context)
-        if starting_date:
-            params["modified_after"] = starting_date.strftime(DATETIME_FORMAT)
+        params = {"per_page": self.current_page_size, "order": "asc"}
+        if context and "modified_after" in context:
+            # An explicit time slice, see `_request_records_sliced`.
+            params["modified_after"] = context["modified_after"]
+            if "modified_before" in context:
+                params["modified_before"] = context["modified_before"]
+        else:
+            starting_date = self.get_starting_timestamp(context)
+            if starting_date:
+                params["modified_after"] = starting_date.strftime(DATETIME_FORMAT)
 
-        end_date = self.config.get("end_date")
-        if end_date:
-            params["modified_before"] = pendulum.parse(end_date).strftime(
-                DATETIME_FORMAT
-            )
+            end_date = self.config.get("end_date")
+            if end_date:
+                params["modified_before"] = pendulum.parse(end_date).strftime(
+                    DATETIME_FORMAT
+                )
+
+        if self.requested_fields:
+            params["_fields"] = ",".join(self.requested_fields)
 
-        if next_page_token is not None:
+        if self.pagination_mode == KEYSET_PAGINATION:
+            params["orderby"] = "modified"
+            params["dates_are_gmt"] = "true"
+
+        if isinstance(next_page_token, dict):
+            # A keyset token, see `WooKeysetPaginator`.
+            params.update(next_page_token)
+        elif isinstance(next_page_token, int):
+            # An offset token, see `WooOffsetPaginator`.
+            params["offset"] = next_page_token
+        elif next_page_token is not None:
             params["page"] = dict(parse_qsl(next_page_token.query)).get('page')
 
-        self.logger.info(f"URL params: {params}")
+        self.logger.debug("URL params: %s", params)
         return params
 
+    @cached_property
+    def requested_fields(self) -> Optional[list[str]]:
+        """Return the top-level fields to request with `_fields`.
+
+        The projection covers the properties selected in the catalog, plus the
+        keys the tap itself relies on: primary keys, the replication key and,
+        when a child stream is synced, the fields its context is built from.
+
+        Returns:
+            A sorted list of field names, or None if projection is disabled.
+        """
+        if not self.config.get("project_fields"):
+            return None
+
+        fields = {
+            name
+            for name in self.schema["properties"]
+            if self.mask.get(("properties", name), True)
+        }
+        fields.update(self.primary_keys or [])
+        fields.discard(STORE_ID_PROPERTY)
+        fields.update(self.required_fields)
+        if self.replication_key:
+            fields.add(self.replication_key)
+        if any(
+            child_stream.selected or child_stream.has_selected_descendents
+            for child_stream in self.child_streams
+        ):
+            fields.update(self.child_context_fields)
+        return sorted(fields)
+
+    @cached_property
+    def meta_data_filter(self) -> Optional[MetaDataFilter]:
+        """Return the stream's `meta_data` filter, if one is configured."""
+        return MetaDataFilter.from_config(
+            (self.config.get("meta_data_filters") or {}).get(self.name),
+            always_keep=self.required_meta_keys,
+        )
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        """Parse the response, filtering `meta_data` before any other processing.
+
+        When `stream_responses` is enabled, records are decoded from the body as
+        it is read from the socket instead of after the whole page has arrived.
+        """
+        size = 0
+
+        def count_bytes(chunks: Iterable[bytes]) -> Iterable[bytes]:
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+
+        if self.config.get("stream_responses"):
+            records = iter_json_array(
+                count_bytes(response.iter_content(STREAM_CHUNK_SIZE))
+            )
+        else:
+            size = len(response.content)
+            records = super().parse_response(response)
+        if self.meta_data_filter is not None:
+            records = map(self.meta_data_filter, records)
+
+        # Only the time spent producing records counts as parse time, not the
+        # time the caller spends on them.
+        records = iter(records)
+        count, parse_time = 0, 0.0
+        while True:
+            started = time.perf_counter()
+            record = next(records, _END)
+            parse_time += time.perf_counter() - started
+            if record is _END:
+                break
+            count += 1
+            yield record
+        self.stream_metrics.observe_page(count, size, parse_time)
+        # Read by `WooOffsetPaginator`, as a streamed body can't be parsed again.
+        response.record_count = count
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return post-processed records, timing `post_process`."""
+        add_time = self.stream_metrics.add_time
+        for record in self.request_records(context):
+            started = time.perf_counter()
+            record = self.post_process(record, context)
+            add_time(WooMetric.POST_PROCESS_TIME, time.perf_counter() - started)
+            if record is not None:
+                yield record
+            self._write_pending_checkpoint()
+
+    def _checkpointed(
+        self, records: Iterable[dict], checkpoint: Callable[[], None]
+    ) -> Iterable[dict]:
+        """Yield records, running ``checkpoint`` once they have all been synced.
+
+        The checkpoint is left in `_pending_checkpoint` while the last record is
+        yielded, and `get_records` runs it when asked for the next record. So a
+        `get_records` override holding records back must sync them as soon as
+        it sees a pending checkpoint. Without records it runs right away.
+        """
+        previous = None
+        for record in records:
+            if previous is not None:
+                yield previous
+            previous = record
+        if previous is None:
+            checkpoint()
+            return
+        self._pending_checkpoint = checkpoint
+        yield previous
+
+    def _write_pending_checkpoint(self) -> None:
+        checkpoint, self._pending_checkpoint = self._pending_checkpoint, None
+        if checkpoint is not None:
+            checkpoint()
+
+    def _transform_record(self, record: dict) -> dict:
+        started = time.perf_counter()
+        record = self.record_transformer(record)
+        self.stream_metrics.add_time(
+            WooMetric.CONFORM_TIME, time.perf_counter() - started
+        )
+        return record
+
+    @cached_property
+    def record_transformer(self) -> RecordTransformer:
+        """Return the transformer compiled from the stream's schema and selection."""
+        return RecordTransformer(self.name, self.schema, self.mask, self.logger)
+
+    def _generate_record_messages(self, record: dict) -> Iterable:
+        """Generate RECORD messages, timing conformance to the schema.
+
+        Deselected properties are removed and values are conformed and checked
+        by the compiled `record_transformer` in a single pass.
+        """
+        if self.TYPE_CONFORMANCE_LEVEL != TypeConformanceLevel.RECURSIVE:
+            return list(super()._generate_record_messages(record))
+        record = self._transform_record(record)
+        return [
+            RecordMessage(
+                stream=stream_map.stream_alias,
+                record=mapped_record,
+                version=None,
+                time_extracted=utc_now(),
+            )
+            for stream_map in self.stream_maps
+            if (mapped_record := stream_map.transform(record)) is not None
+        ]
+
+    @cached_property
+    def stream_metrics(self) -> StreamMetrics:
+        """Return the stream's hot-path measurements."""
+        return StreamMetrics()
+
+    @cached_property
+    def page_size_controller(self) -> Optional[PageSizeController]:
+        """Return the stream's page size controller, if page sizes are adaptive."""
+        if not self.config.get("adaptive_page_size"):
+            return None
+        return PageSizeController(
+            initial=self.page_size,
+            minimum=self.config.get("min_page_size") or 10,
+            maximum=MAX_PAGE_SIZE,
+            target_latency=self.config.get("target_page_latency") or 5.0,
+        )
+
+    @property
+    def current_page_size(self) -> int:
+        """Return the page size to request next."""
+        if self.page_size_controller is None:
+            return self.page_size
+        return self.page_size_controller.size
+
+    def _request(
+        self,
+        prepared_request: requests.PreparedRequest,
+        context: Optional[dict],
+        *,
+        cached: bool = True,
+    ) -> requests.Response:
+        """Send a request when the rate limiter allows it.
+
+        The page size is adapted to how the request went when
+        `adaptive_page_size` is enabled. Responses found in the response cache
+        are returned without contacting the store, unless ``cached`` is False
+        and the cache is not replaying a sync.
+        """
+        controller = self.page_size_controller
+        if controller is not None:
+            self._apply_page_size(prepared_request)
+        cache = self._tap.response_cache
+        if cache is not None and (cached or cache.replay):
+            response = cache.get(prepared_request)
+            if response is not None:
+                self.stream_metrics.increment(WooMetric.CACHE_HIT_COUNT)
+                return response
+
+        waited = self.rate_limiter.acquire()
+        try:
+            response = super()._request(prepared_request, context)
+        except (RetriableAPIError, requests.exceptions.Timeout) as ex:
+            response = getattr(ex, "response", None)
+            if response is not None:
+                self.stream_metrics.observe_request(
+                    response.elapsed.total_seconds(), waited
+                )
+            if controller is not None and (
+                response is None or response.status_code >= 500
+            ):
+                if controller.record_failure():
+                    self._log_page_size()
+            raise
+
+        latency = response.elapsed.total_seconds()
+        self.stream_metrics.observe_request(latency, waited)
+        if controller is not None and controller.record_success(latency):
+            self._log_page_size()
+        if cache is not None:
+            cache.put(prepared_request, response)
+        return response
+
+    def backoff_handler(self, details: dict) -> None:
+        """Count the retry, then log it as usual."""
+        self.stream_metrics.increment(WooMetric.RETRY_COUNT)
+        super().backoff_handler(details)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Return the rate limiter shared by all streams of the same store."""
+        return self._tap.get_rate_limiter(self.store_id)
+
+    def validate_response(self, response: requests.Response) -> None:
+        """Validate a response, slowing down if the store is throttling us."""
+        if response.status_code in THROTTLE_STATUSES:
+            retry_after = retry_after_seconds(response)
+            self.logger.warning(
+                "Throttled by the store (%s), retrying after %s seconds.",
+                response.status_code,
+                retry_after if retry_after is not None else "backoff",
+            )
+            self.rate_limiter.throttle(retry_after)
+        elif response.ok:
+            self.rate_limiter.recover()
+        super().validate_response(response)
+
+    def _apply_page_size(self, prepared_request: requests.PreparedRequest) -> None:
+        """Update `per_page` on a request whose page size is free to change.
+
+        Retries resend the same prepared request, so this is how a retry picks
+        up a smaller page. Requests for a page number past the first keep their
+        size, since their position depends on it.
+        """
+        params = request_params(prepared_request)
+        if "per_page" not in params or int(params.get("page", 1)) > 1:
+            return
+        params["per_page"] = self.current_page_size
+        url = urlparse(prepared_request.url)
+        prepared_request.url = url._replace(query=urlencode(params)).geturl()
+
+    def _log_page_size(self) -> None:
+        self._log_metric(
+            metrics.Point(
+                "gauge",
+                WooMetric.PAGE_SIZE,
+                self.current_page_size,
+                {metrics.Tag.STREAM: self.name, metrics.Tag.ENDPOINT: self.path},
+            )
+        )
+
+    @property
+    def pagination_mode(self) -> str:
+        """Return the configured pagination mode."""
+        if not self.replication_key:
+            return "offset"
+        return self.config.get("pagination_mode") or "offset"
+
+    @property
+    def is_sorted(self) -> bool:
+        """Return whether records arrive in replication key order.
+
+        Only keyset pagination sorts on the replication key, which makes the
+        stream's state resumable mid-sync.
+        """
+        return self.pagination_mode == KEYSET_PAGINATION
+
+    @property
+    def page_concurrency(self) -> int:
+        """Return how many pages may be requested at the same time."""
+        return max(int(self.config.get("page_concurrency") or 1), 1)
+
+    @property
+    def time_slice(self) -> Optional[timedelta]:
+        """Return the width of a time slice, if time slicing is enabled."""
+        days = self.config.get("time_slice_days")
+        if not self.supports_time_slicing or not days:
+            return None
+        return timedelta(days=days)
+
+    @property
+    def time_slice_concurrency(self) -> int:
+        """Return how many time slices may be extracted at the same time."""
+        return max(int(self.config.get("time_slice_concurrency") or 1), 1)
+
+    def get_time_slices(self, context: Optional[dict]) -> list[tuple]:
+        """Split the stream's modification window into time slices.
+
+        Returns:
+            A list of ``(start, end)`` datetimes covering the sync window, or an
+            empty list if the window has no lower bound.
+        """
+        start = self.get_starting_timestamp(context)
+        if not start or not self.time_slice:
+            return []
+
+        end_date = self.config.get("end_date")
+        end = pendulum.parse(end_date) if end_date else pendulum.now("UTC")
+        slices = []
+        while start < end:
+            slice_end = min(start + self.time_slice, end)
+            slices.append((start, slice_end))
+            start = slice_end
+        return slices
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return records, using the ones prefetched by the parent if any."""
+        if self._prefetched_records is not None:
+            records, self._prefetched_records = self._prefetched_records, None
+        else:
+            records = self.fetch_records(context)
+        if self.store_id is None:
+            yield from records
+            return
+        for record in records:
+            record[STORE_ID_PROPERTY] = self.store_id
+            yield record
+
+    def fetch_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records, fanning requests out over worker pools if configured."""
+        if self.time_slice and not (context and "modified_after" in context):
+            time_slices = self.get_time_slices(context)
+            if time_slices:
+                yield from self._request_records_sliced(context, time_slices)
+                return
+
+        if self.pagination_mode == KEYSET_PAGINATION:
+            # The bookmark moves with every page, so keyset syncs resume as is.
+            yield from self._request_records_keyset(context)
+        elif self.checkpoint_pages and not (context and "modified_after" in context):
+            yield from self._request_records_resumable(context)
+        elif self.page_concurrency > 1 and self.page_size_controller is None:
+            yield from self._request_records_concurrently(context)
+        else:
+            yield from super().request_records(context)
+
+    def _request_records_sliced(
+        self, context: Optional[dict], time_slices: list[tuple]
+    ) -> Iterable[dict]:
+        """Request records one time slice at a time, several slices in parallel.
+
+        Slices are yielded in chronological order. Once the records of a slice
+        have been synced, the bookmark is moved to its end so a later run does
+        not fetch it again.
+        """
+        self.logger.info(
+            "Extracting %d time slices with %d workers",
+            len(time_slices),
+            self.time_slice_concurrency,
+        )
+
+        def slice_records(time_slice: tuple) -> Iterable[dict]:
+            slice_start, slice_end = time_slice
+            return self.fetch_records(
+                {
+                    **(context or {}),
+                    "modified_after": slice_start.strftime(DATETIME_FORMAT),
+                    "modified_before": slice_end.strftime(DATETIME_FORMAT),
+                }
+            )
+
+        for (_, slice_end), records in ordered_streams(
+            slice_records, time_slices, self.time_slice_concurrency
+        ):
+            yield from self._checkpointed(
+                records, partial(self._write_slice_bookmark, context, slice_end)
+            )
+
+    def _write_slice_bookmark(self, context: Optional[dict], slice_end) -> None:
+        """Move the bookmark to the end of a synced time slice."""
+        self._sync_pending_children()
+        state = self.get_context_state(context)
+        with self._tap.message_lock:
+            state["replication_key"] = self.replication_key
+            state["replication_key_value"] = slice_end.strftime(GMT_DATETIME_FORMAT)
+        self._write_state_message()
+
+    def _request_pages(
+        self, context: Optional[dict], paginator: BaseAPIPaginator
+    ) -> Iterable[tuple[requests.Response, Iterable[dict]]]:
+        """Request pages one after another.
+
+        Each response is yielded with its records, which must be consumed before
+        the next page is requested.
+        """
+        decorated_request = self.request_decorator(self._request)
+
+        with metrics.http_request_counter(self.name, self.path) as request_counter:
+            request_counter.context = context
+
+            while not paginator.finished:
+                prepared_request = self.prepare_request(
+                    context, next_page_token=paginator.current_value
+                )
+                response = decorated_request(prepared_request, context)
+                request_counter.increment()
+                self.update_sync_costs(prepared_request, response, context)
+                yield response, self.parse_response(response)
+                paginator.advance(response)
+
+    def _request_records_keyset(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records page by page, moving a keyset cursor forward."""
+        paginator = WooKeysetPaginator(self.replication_key)
+        for _, records in self._request_pages(context, paginator):
+            yield from paginator.consume(list(records))
+
+    @property
+    def checkpoint_pages(self) -> bool:
+        """Return whether the position of each page is checkpointed in state."""
+        return bool(
+            self.config.get("checkpoint_pages")
+            and self.replication_key
+            and not self.parent_stream_type
+        )
+
+    def _request_records_resumable(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records page by page, checkpointing the position in state.
+
+        Once the records of a page have been synced, the filters and the
+        position of the next page are stored under the partition's
+        `checkpoint` key and a STATE message is written. A sync interrupted
+        mid-stream picks up from there, so at most the page being extracted at
+        the time is fetched again.
+        """
+        state = self.get_context_state(context)
+        checkpoint = state.get(CHECKPOINT_KEY)
+        if checkpoint:
+            self.logger.info("Resuming interrupted sync from %s", checkpoint)
+            filters = checkpoint["params"]
+            if checkpoint.get("replication_key_value"):
+                # Progress markers are reset when a sync starts.
+                with self._tap.message_lock:
+                    increment_state(
+                        state,
+                        latest_record={
+                            self.replication_key: checkpoint["replication_key_value"]
+                        },
+                        replication_key=self.replication_key,
+                        is_sorted=False,
+                        check_sorted=False,
+                    )
+            if "offset" in checkpoint:
+                paginator = WooOffsetPaginator(checkpoint["offset"])
+            else:
+                paginator = WooPaginator(checkpoint["page"])
+        else:
+            params = self.get_url_params(context, None)
+            filters = {
+                key: params[key]
+                for key in ("modified_after", "modified_before")
+                if key in params
+            }
+            paginator = self.get_new_paginator()
+
+        for response, records in self._request_pages(
+            {**(context or {}), **filters}, paginator
+        ):
+            params = request_params(response.request)
+            yield from self._checkpointed(
+                records, partial(self._write_checkpoint, state, filters, params)
+            )
+
+        with self._tap.message_lock:
+            state.pop(CHECKPOINT_KEY, None)
+
+    def _write_checkpoint(self, state: dict, filters: dict, params: dict) -> None:
+        """Record the position of the page after the given request."""
+        self._sync_pending_children()
+        if "offset" in params:
+            position = {"offset": int(params["offset"]) + int(params["per_page"])}
+        else:
+            position = {"page": int(params.get("page", 1)) + 1}
+        progress = state.get(PROGRESS_MARKERS) or {}
+        with self._tap.message_lock:
+            state[CHECKPOINT_KEY] = {
+                "params": filters,
+                **position,
+                "replication_key_value": progress.get("replication_key_value"),
+            }
+        self._write_state_message()
+
+    def _request_records_concurrently(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request the first page, then the remaining pages in parallel.
+
+        The page count comes from the ``X-WP-TotalPages`` header of the first
+        response. Requests are prepared on the calling thread and records are
+        yielded in page order, so state handling matches sequential pagination.
+        """
+        decorated_request = self.request_decorator(self._request)
+
+        def fetch(prepared_request: requests.PreparedRequest):
+            response = decorated_request(prepared_request, context)
+            return prepared_request, response, list(self.parse_response(response))
+
+        with metrics.http_request_counter(self.name, self.path) as request_counter:
+            request_counter.context = context
+
+            prepared_request = self.prepare_request(context, next_page_token=None)
+            _, response, records = fetch(prepared_request)
+            request_counter.increment()
+            self.update_sync_costs(prepared_request, response, context)
+            if not records:
+                return
+            yield from records
+
+            total_pages = int(response.headers.get("X-WP-TotalPages", 1))
+            self.logger.info(
+                "Fetching %d pages (%s records) with %d workers",
+                total_pages,
+                response.headers.get("X-WP-Total", "unknown"),
+                self.page_concurrency,
+            )
+            prepared_requests = (
+                self.prepare_request(context, WooPaginator.page_token(page))
+                for page in range(2, total_pages + 1)
+            )
+            for prepared_request, response, records in ordered_map(
+                fetch, prepared_requests, self.page_concurrency
+            ):
+                request_counter.increment()
+                self.update_sync_costs(prepared_request, response, context)
+                if not records:
+                    break
+                yield from records
+
+    @property
+    def child_concurrency(self) -> int:
+        """Return how many child contexts may be fetched at the same time."""
+        return max(int(self.config.get("child_concurrency") or 1), 1)
+
+    def _sync_children(self, child_context: Optional[dict]) -> None:
+        """Sync child streams, or queue their context when fetching concurrently."""
+        if self.store_id is not None and child_context is not None:
+            child_context = {**child_context, STORE_ID_PROPERTY: self.store_id}
+        if self.child_concurrency <= 1 or child_context is None:
+            super()._sync_children(child_context)
+            return
+
+        self._pending_child_contexts.append(child_context)
+        if len(self._pending_child_contexts) >= self.page_size:
+            self._sync_pending_children()
+
+    def _sync_pending_children(self) -> None:
+        """Fetch the queued child contexts concurrently and sync them in order.
+
+        Raw records are fetched by a worker pool, then each child stream is synced
+        on the calling thread in the order its contexts were queued, so the
+        output is the same as with sequential child syncs. The child streams
+        write no STATE message meanwhile, and the state increments of the
+        parent records are only applied once their children are synced, so a
+        single STATE message follows that never gets ahead of the children.
+        """
+        contexts = self._pending_child_contexts[:]
+        self._pending_child_contexts.clear()
+        if not contexts:
+            return
+
+        child_streams = [
+            child_stream
+            for child_stream in self.child_streams
+            if child_stream.selected or child_stream.has_selected_descendents
+        ]
+        for child_stream in child_streams:
+            fetched = ordered_map(
+                lambda context: list(child_stream.fetch_records(context)),
+                contexts,
+                self.child_concurrency,
+            )
+            child_stream._holding_state_messages = True
+            try:
+                for context, records in zip(contexts, fetched):
+                    child_stream._prefetched_records = records
+                    child_stream.sync(context=copy.copy(context))
+            finally:
+                child_stream._holding_state_messages = False
+
+        increments = self._pending_increments[:]
+        self._pending_increments.clear()
+        for latest_record, context in increments:
+            self._increment_stream_state(latest_record, context=context)
+        self._is_state_flushed = False
+        self._write_state_message()
+
+    def _write_state_message(self) -> None:
+        """Write a STATE message once all queued child contexts are synced.
+
+        While any stream has records that are not in a finished batch file
+        yet, the state would cover records that were not sent, so it is held
+        back until the next BATCH message.
+        """
+        self._sync_pending_children()
+        with self._tap.message_lock:
+            if self._holding_state_messages or self._tap.pending_batches:
+                return
+            super()._write_state_message()
+
+    def get_batches(
+        self, batch_config: BatchConfig, context: Optional[dict] = None
+    ) -> Iterable[tuple[BaseBatchFileEncoding, list[str]]]:
+        """Write the stream's records to batch files, yielding each manifest.
+
+        Records are conformed like RECORD messages and encoded by a
+        `BatchFileWriter` worker thread. Files are rotated once they reach
+        `batch_file_max_mb` or the `batch_size` of the batch config. Child
+        streams keep writing to the same file across parent records, and
+        their files are finished whenever the parent's are, so that the
+        following STATE message covers everything sent so far.
+        """
+        if self._batch_writer is None:
+            name = f"{self.tap_name}--{self.name}"
+            if self.store_id is not None:
+                name = f"{name}-{self.store_id}"
+            self._batch_writer = BatchFileWriter(
+                batch_config,
+                name,
+                schema=get_selected_schema(self.name, self.schema, self.mask),
+                max_bytes=int(self.config.get("batch_file_max_mb", 64) * 1024**2),
+            )
+        writer = self._batch_writer
+        for record in self._sync_records(context, write_messages=False):
+            with self._tap.message_lock:
+                self._tap.pending_batches.add(self)
+            url = writer.add(self._transform_record(record))
+            if url is not None:
+                self._finish_child_batches()
+                with self._tap.message_lock:
+                    self._tap.pending_batches.discard(self)
+                yield batch_config.encoding, [url]
+
+        if self.parent_stream_type is None:
+            self._batch_writer = None
+            url = writer.close()
+            self._finish_child_batches(close=True)
+            with self._tap.message_lock:
+                self._tap.pending_batches.discard(self)
+            if url is not None:
+                yield batch_config.encoding, [url]
+
+    def _finish_child_batches(self, close: bool = False) -> None:
+        """Finish the current batch files of the child streams.
+
+        Child contexts queued by `child_concurrency` are synced first, so the
+        files cover the children of every parent record written so far.
+        """
+        self._sync_pending_children()
+        for child_stream in self.descendent_streams:
+            writer = child_stream._batch_writer
+            if writer is None:
+                continue
+            url = writer.close() if close else writer.rotate()
+            if close:
+                child_stream._batch_writer = None
+            with self._tap.message_lock:
+                self._tap.pending_batches.discard(child_stream)
+            if url is not None:
+                child_stream._write_batch_message(
+                    encoding=writer.batch_config.encoding, manifest=[url]
+                )
+
+    # The tap state is shared by every stream and may be written out by another
+    # stream's thread when `stream_concurrency` is set, so all access to it goes
+    # through the tap's message lock.
+
+    def get_context_state(self, context: Optional[dict]) -> dict:
+        with self._tap.message_lock:
+            return super().get_context_state(context)
+
+    def get_starting_replication_key_value(self, context: Optional[dict]):
+        """Get the starting replication value, also before the context is synced.
+
+        The SDK records it when a context starts syncing, but child contexts
+        may be fetched ahead of that, see `_sync_pending_children`.
+        """
+        with self._tap.message_lock:
+            if STARTING_MARKER not in self.get_context_state(context):
+                self._write_starting_replication_value(context)
+            return super().get_starting_replication_key_value(context)
+
+    def _increment_stream_state(
+        self, latest_record: dict, *, context: Optional[dict] = None
+    ) -> None:
+        if self._pending_child_contexts:
+            # The children of the record are queued, see `_sync_pending_children`.
+            self._pending_increments.append((latest_record, context))
+            return
+        with self._tap.message_lock:
+            super()._increment_stream_state(latest_record, context=context)
+
+    def reset_state_progress_markers(self, state: Optional[dict] = None) -> None:
+        with self._tap.message_lock:
+            super().reset_state_progress_markers(state)
+
+    def _finalize_state(self, state: Optional[dict] = None) -> None:
+        self._sync_pending_children()
+        with self._tap.message_lock:
+            super()._finalize_state(state)
+
+    def skip_child_requests(self) -> None:
+        """Count the requests a record spares the child streams that would sync."""
+        for child_stream in self.child_streams:
+            if child_stream.selected or child_stream.has_selected_descendents:
+                child_stream.skipped_request_count += 1
+
+    def log_sync_costs(self) -> None:
+        """Log sync costs, along with the number of requests that were avoided."""
+        super().log_sync_costs()
+        if self.skipped_request_count:
+            self._log_metric(
+                metrics.Point(
+                    "counter",
+                    WooMetric.SKIPPED_REQUEST_COUNT,
+                    self.skipped_request_count,
+                    {metrics.Tag.STREAM: self.name, metrics.Tag.ENDPOINT: self.path},
+                )
+            )
+        if self.page_size_controller is not None:
+            self._log_page_size()
+        tags = {metrics.Tag.STREAM: self.name, metrics.Tag.ENDPOINT: self.path}
+        if self.store_id is not None:
+            tags[STORE_ID_PROPERTY] = self.store_id
+        if self.stream_metrics.latency.count or self.stream_metrics.counters:
+            for point in self.stream_metrics.points(tags):
+                self._log_metric(point)
+
+    def _log_metric(self, point: metrics.Point) -> None:
+        """Log a metric, also appending it to the `metrics_file` if configured."""
+        super()._log_metric(point)
+        self._tap.write_metric(point)
+
+    @property
+    def deletion_sweep(self) -> bool:
+        """Return whether deleted records are detected after each sync."""
+        return bool(
+            self.supports_deletion_sweep
+            and not self.parent_stream_type
+            and self.config.get("deletion_sweep_dir")
+        )
+
+    @property
+    def id_set_path(self) -> Path:
+        """Return the file holding the ids seen by the previous sweep."""
+        name = self.name if self.store_id is None else f"{self.name}-{self.store_id}"
+        return Path(self.config["deletion_sweep_dir"]) / f"{name}.ids"
+
+    def sweep_deleted_records(self) -> None:
+        """Write tombstone records for the records deleted since the last sweep.
+
+        Only ids are listed, so a sweep costs a small fraction of a full
+        extraction. The ids are never read from the response cache, which
+        would hide the deletions, except when replaying a sync. Ids that were seen by the previous sweep but are missing
+        now are looked up again with `include=` before being reported, so
+        records shifting between pages while the sweep runs are not mistaken
+        for deleted ones. The first sweep only records the current ids.
+        """
+        current = self._list_ids()
+        previous = load_ids(self.id_set_path)
+        deleted: list[int] = []
+        if previous is not None:
+            missing = missing_ids(previous, current)
+            deleted = missing_ids(missing, self._existing_ids(missing))
+            current = sorted({*current, *missing}.difference(deleted))
+
+        deleted_at = utc_now().isoformat()
+        for id_ in deleted:
+            record = {"id": id_, DELETED_AT_PROPERTY: deleted_at}
+            if self.store_id is not None:
+                record[STORE_ID_PROPERTY] = self.store_id
+            self._write_record_message(record)
+        self.stream_metrics.increment(WooMetric.DELETED_RECORD_COUNT, len(deleted))
+        save_ids(self.id_set_path, current)
+        self.logger.info(
+            "Swept %d '%s' ids, %d records were deleted",
+            len(current),
+            self.name,
+            len(deleted),
+        )
+
+    def _list_ids(self) -> list[int]:
+        """Return the sorted ids of all the records of the stream."""
+        decorated_request = self.request_decorator(self._request)
+
+        def prepare(page: int, per_page: int) -> requests.PreparedRequest:
+            return self.build_prepared_request(
+                method="GET",
+                url=self.get_url(None),
+                params={
+                    "_fields": "id",
+                    "orderby": "id",
+                    "order": "asc",
+                    "per_page": per_page,
+                    "page": page,
+                },
+            )
+
+        def fetch(prepared_request: requests.PreparedRequest) -> list[int]:
+            response = decorated_request(prepared_request, None, cached=False)
+            return [row["id"] for row in response.json()]
+
+        first = decorated_request(prepare(1, MAX_PAGE_SIZE), None, cached=False)
+        ids = [row["id"] for row in first.json()]
+        # The first page size may have been adapted, the others must match it.
+        per_page = int(request_params(first.request)["per_page"])
+        total_pages = int(first.headers.get("X-WP-TotalPages", 1))
+        prepared_requests = (
+            prepare(page, per_page) for page in range(2, total_pages + 1)
+        )
+        concurrency = max(int(self.config.get("deletion_sweep_concurrency") or 1), 1)
+        for page_ids in ordered_map(fetch, prepared_requests, concurrency):
+            ids.extend(page_ids)
+        return sorted(set(ids))
+
+    def _existing_ids(self, ids: list[int]) -> list[int]:
+        """Return the sorted ids, among the given ones, that the store still has."""
+        existing = []
+        for start in range(0, len(ids), MAX_PAGE_SIZE):
+            chunk = ids[start : start + MAX_PAGE_SIZE]
+            prepared_request = self.build_prepared_request(
+                method="GET",
+                url=self.get_url(None),
+                params={
+                    "_fields": "id",
+                    "include": ",".join(map(str, chunk)),
+                    "per_page": len(chunk),
+                },
+            )
+            response = self.request_decorator(self._request)(
+                prepared_request, None, cached=False
+            )
+            existing.extend(row["id"] for row in response.json())
+        return sorted(existing)
+
     def get_new_paginator(self) -> BaseAPIPaginator:
         """Get a fresh paginator for this API endpoint.
 
         Returns:
             A paginator instance.
         """
+        if self.page_size_controller is not None:
+            return WooOffsetPaginator()
         return WooPaginator()
@@ -0,0 +1,262 @@
+"""Size-bounded batch files written from a background thread."""
+
+from __future__ import annotations
+
+import gzip
+import queue
+import threading
+import typing as t
+from uuid import uuid4
+
+from singer_sdk.helpers._batch import BatchConfig, BatchFileFormat
+
+from tap_woo.helpers.output import dumps
+from tap_woo.helpers.transform import schema_types
+
+# Maximum number of records waiting to be encoded.
+QUEUE_SIZE = 1000
+
+_ROTATE = object()
+
+# Arrow types of the scalar JSON schema types, by name of their factory.
+ARROW_SCALAR_TYPES = {
+    "string": "string",
+    "integer": "int64",
+    "number": "float64",
+    "boolean": "bool_",
+}
+
+Converter = t.Callable[[t.Any], t.Any]
+
+
+def _json_string(value: t.Any) -> t.Optional[str]:
+    return None if value is None else dumps(value).decode()
+
+
+def _arrow_type(schema: dict) -> tuple[t.Any, t.Optional[Converter]]:
+    """Return the Arrow type of a JSON schema and a converter for its values.
+
+    Values that may be of several types, like the `value` of meta data, or
+    objects without properties, are stored as JSON strings, so every file of
+    a stream has the same columns whatever the records it holds.
+    """
+    import pyarrow as pa
+
+    types = [name for name in schema_types(schema) if name != "null"]
+    if len(types) == 1:
+        if types[0] in ARROW_SCALAR_TYPES:
+            return getattr(pa, ARROW_SCALAR_TYPES[types[0]])(), None
+        if types[0] == "object" and schema.get("properties"):
+            return _arrow_struct(schema["properties"])
+        if types[0] == "array" and isinstance(schema.get("items"), dict):
+            item_type, convert_item = _arrow_type(schema["items"])
+            if convert_item is None:
+                return pa.list_(item_type), None
+            return pa.list_(item_type), lambda items: (
+                None if items is None else [convert_item(item) for item in items]
+            )
+    return pa.string(), _json_string
+
+
+def _arrow_struct(properties: dict) -> tuple[t.Any, t.Optional[Converter]]:
+    import pyarrow as pa
+
+    fields, converters = [], {}
+    for name, property_schema in properties.items():
+        arrow_type, convert = _arrow_type(property_schema)
+        fields.append(pa.field(name, arrow_type))
+        if convert is not None:
+            converters[name] = convert
+    if not converters:
+        return pa.struct(fields), None
+
+    def convert(record: t.Optional[dict]) -> t.Optional[dict]:
+        if record is None:
+            return None
+        return {
+            **record,
+            **{
+                name: convert_value(record[name])
+                for name, convert_value in converters.items()
+                if name in record
+            },
+        }
+
+    return pa.struct(fields), convert
+
+
+class _CountingFile:
+    """File wrapper counting the bytes written through it."""
+
+    def __init__(self, file: t.BinaryIO) -> None:
+        self.file = file
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+class BatchFileWriter:
+    """Encode records into batch files on a worker thread.
+
+    Records are handed over with `add` and encoded as gzipped JSON lines, or
+    as Parquet, into the storage of a `BatchConfig`. Once the current file
+    reaches ``max_bytes`` or the batch size of the config, `add` returns the
+    URL of the finished file: at that point every record added so far is in
+    a closed file, so the caller may emit a BATCH message and the state that
+    covers those records. The size bound is approximate, since records still
+    queued when it is reached go to the same file. Parquet columns follow
+    the JSON schema of the records rather than the records of each file.
+    """
+
+    def __init__(
+        self,
+        batch_config: BatchConfig,
+        name: str,
+        schema: dict,
+        max_bytes: int,
+    ) -> None:
+        """Start the worker thread.
+
+        Args:
+            batch_config: Encoding, storage and maximum records per file.
+            name: Prefix of the file names, after the storage prefix.
+            schema: JSON schema of the records.
+            max_bytes: Size above which files are rotated.
+        """
+        self.batch_config = batch_config
+        self.schema = schema
+        self.max_bytes = max_bytes
+        self.parquet = batch_config.encoding.format == BatchFileFormat.PARQUET
+        self.gzip = batch_config.encoding.compression == "gzip"
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as ex:
+                msg = "Parquet batches require the `parquet` extra to be installed."
+                raise RuntimeError(msg) from ex
+        self._name = f"{batch_config.storage.prefix or ''}{name}-{uuid4()}"
+        self._file_count = 0
+        self._pending = 0
+        self._full = threading.Event()
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._done: queue.Queue = queue.Queue()
+        self._error: t.Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        """Return the number of records added since the last finished file."""
+        return self._pending
+
+    def add(self, record: dict) -> t.Optional[str]:
+        """Queue a record, returning a finished file's URL when one is rotated."""
+        self._put(record)
+        self._pending += 1
+        if self._full.is_set() or self._pending >= self.batch_config.batch_size:
+            return self.rotate()
+        return None
+
+    def rotate(self) -> t.Optional[str]:
+        """Close the current file, returning its URL if it has any records."""
+        if not self._pending:
+            return None
+        self._put(_ROTATE)
+        url = self._done.get()
+        self._raise_error()
+        self._pending = 0
+        self._full.clear()
+        return url
+
+    def close(self) -> t.Optional[str]:
+        """Finish the last file and stop the worker thread."""
+        url = self.rotate()
+        self._put(None)
+        self._thread.join()
+        self._raise_error()
+        return url
+
+    def _put(self, item: t.Any) -> None:
+        while True:
+            self._raise_error()
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        try:
+            while self._encode_file():
+                pass
+        except BaseException as ex:  # noqa: BLE001
+            self._error = ex
+            self._done.put(None)
+
+    def _filename(self) -> str:
+        self._file_count += 1
+        if self.parquet:
+            extension = "parquet.gz" if self.gzip else "parquet"
+        else:
+            extension = "json.gz" if self.gzip else "json"
+        return f"{self._name}-{self._file_count}.{extension}"
+
+    def _encode_file(self) -> bool:
+        """Encode queued records into one file, returning False once closed."""
+        item = self._queue.get()
+        if item is None:
+            return False
+        filename = self._filename()
+        with self.batch_config.storage.fs(create=True) as fs:
+            with fs.open(filename, "wb") as file:
+                if self.parquet:
+                    self._write_parquet(file, item)
+                else:
+                    self._write_jsonl(file, item)
+            self._done.put(fs.geturl(filename))
+        return True
+
+    def _records(self, item: t.Any) -> t.Iterator[dict]:
+        """Yield queued records until the next rotation."""
+        while item is not _ROTATE:
+            yield item
+            item = self._queue.get()
+
+    def _write_jsonl(self, file: t.BinaryIO, item: t.Any) -> None:
+        output = _CountingFile(file)
+        if self.gzip:
+            with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=6) as gz:
+                for record in self._records(item):
+                    gz.write(dumps(record) + b"\n")
+                    if output.size >= self.max_bytes:
+                        self._full.set()
+        else:
+            for record in self._records(item):
+                output.write(dumps(record) + b"\n")
+                if output.size >= self.max_bytes:
+                    self._full.set()
+
+    def _write_parquet(self, file: t.BinaryIO, item: t.Any) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrow_type, convert = _arrow_struct(self.schema.get("properties", {}))
+        rows, size = [], 0
+        for record in self._records(item):
+            rows.append(record if convert is None else convert(record))
+            # The encoded JSON size stands in for the Parquet size, which is
+            # only known once the file is written.
+            size += len(dumps(record))
+            if size >= self.max_bytes:
+                self._full.set()
+        table = pa.Table.from_pylist(rows, schema=pa.schema(list(arrow_type)))
+        pq.write_table(table, file, compression="GZIP" if self.gzip else "snappy")
@@ -0,0 +1,162 @@
+"""On-disk cache of API responses."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import typing as t
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+from singer_sdk.exceptions import FatalAPIError
+
+READ_WRITE = "read_write"
+REPLAY = "replay"
+# Eviction frees space down to this fraction of the maximum size.
+EVICTION_TARGET = 0.9
+
+
+def cache_key(request: requests.PreparedRequest) -> str:
+    """Return the cache key of a request: its endpoint and sorted parameters."""
+    url = urlparse(request.url)
+    query = urlencode(sorted(parse_qsl(url.query)))
+    endpoint = f"{request.method} {url.netloc}{url.path}?{query}"
+    return hashlib.sha256(endpoint.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Store response bodies as gzipped files keyed by endpoint and parameters.
+
+    Entries older than ``max_age`` are ignored and removed. Once the files take
+    more than ``max_bytes``, the least recently written ones are evicted. In
+    replay mode, a request missing from the cache is an error instead of being
+    sent to the store.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        mode: str = READ_WRITE,
+        max_bytes: int = 1024**3,
+        max_age: t.Optional[float] = None,
+    ) -> None:
+        """Open a cache directory, creating it if needed.
+
+        Args:
+            directory: Where to store the cached responses.
+            mode: `read_write` or `replay`.
+            max_bytes: Maximum total size of the cached files.
+            max_age: Maximum age of an entry in seconds, unlimited if None.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.replay = mode == REPLAY
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        with self._lock:
+            self._size = sum(path.stat().st_size for path in self._paths())
+            self._evict(self.max_bytes)
+
+    def _paths(self) -> t.Iterator[Path]:
+        return self.directory.glob("*/*.gz")
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.gz"
+
+    def _is_expired(self, mtime: float) -> bool:
+        return self.max_age is not None and time.time() - mtime > self.max_age
+
+    def get(self, request: requests.PreparedRequest) -> t.Optional[requests.Response]:
+        """Return the cached response to a request, if any.
+
+        Raises:
+            FatalAPIError: In replay mode, if the response is not cached.
+        """
+        path = self._path(cache_key(request))
+        try:
+            if self._is_expired(path.stat().st_mtime):
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with gzip.open(path, "rb") as cached:
+                header = json.loads(cached.readline())
+                body = cached.read()
+        except FileNotFoundError:
+            if self.replay:
+                msg = f"Response not found in the replay cache: {request.url}"
+                raise FatalAPIError(msg) from None
+            return None
+
+        response = requests.Response()
+        response.status_code = header["status_code"]
+        response.headers.update(header["headers"])
+        response.url = request.url
+        response.request = request
+        response.reason = "Cached"
+        response.elapsed = timedelta(0)
+        response._content = body
+        response.raw = io.BytesIO(body)
+        return response
+
+    def put(self, request: requests.PreparedRequest, response: requests.Response):
+        """Cache the response to a request, reading its body if needed."""
+        if self.replay:
+            return
+        header = {
+            "url": request.url,
+            "status_code": response.status_code,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                # The body is stored decoded.
+                if name.lower() not in ("content-encoding", "content-length")
+            },
+        }
+        path = self._path(cache_key(request))
+        path.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode="wb", compresslevel=5) as cached:
+                cached.write(json.dumps(header).encode() + b"\n")
+                cached.write(response.content)
+        size = os.stat(tmp.name).st_size
+        with self._lock:
+            if path.exists():
+                self._size -= path.stat().st_size
+            os.replace(tmp.name, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict(self.max_bytes * EVICTION_TARGET)
+
+    def _remove(self, path: Path) -> None:
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            self._size -= size
+
+    def _evict(self, target: float) -> None:
+        """Remove expired entries, then the oldest ones until under ``target``."""
+        entries = []
+        for path in self._paths():
+            stat = path.stat()
+            if self._is_expired(stat.st_mtime):
+                path.unlink()
+                self._size -= stat.st_size
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            path.unlink()
+            self._size -= size
@@ -0,0 +1,127 @@
+"""Thread pool helpers shared by the concurrent extraction modes."""
+
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import typing as t
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_T = t.TypeVar("_T")
+_R = t.TypeVar("_R")
+
+_END = object()
+
+
+def ordered_map(
+    func: t.Callable[[_T], _R],
+    items: t.Iterable[_T],
+    max_workers: int,
+) -> t.Iterator[_R]:
+    """Yield ``func(item)`` for every item, in input order.
+
+    At most ``max_workers`` calls are in flight at any time and ``items`` is
+    consumed lazily from the calling thread, so memory stays bounded by the
+    worker count rather than by the number of items.
+
+    Args:
+        func: Callable run in a worker thread for each item.
+        items: Inputs for ``func``.
+        max_workers: Maximum number of concurrent calls.
+
+    Yields:
+        The result of ``func`` for each item, in the order of ``items``.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(
+            executor.submit(func, item) for item in itertools.islice(items, max_workers)
+        )
+        try:
+            while pending:
+                result = pending.popleft().result()
+                # Keep the pool busy while the caller handles this result.
+                for item in itertools.islice(items, 1):
+                    pending.append(executor.submit(func, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def ordered_streams(
+    func: t.Callable[[_T], t.Iterable[_R]],
+    items: t.Iterable[_T],
+    max_workers: int,
+    buffer_size: int = 1000,
+) -> t.Iterator[tuple[_T, t.Iterator[_R]]]:
+    """Drain ``func(item)`` for several items at once, yielding them in order.
+
+    Each iterable is consumed by a worker thread into a bounded buffer, so
+    later items make progress while the caller reads an earlier one. The
+    caller receives ``(item, elements)`` pairs in input order; once it moves
+    on to the next pair, the previous item is known to be fully consumed.
+
+    Args:
+        func: Callable returning the elements for an item.
+        items: Inputs for ``func``.
+        max_workers: Maximum number of items drained at the same time.
+        buffer_size: Maximum number of elements buffered per item.
+
+    Yields:
+        Each item together with an iterator over its elements.
+    """
+    stop = threading.Event()
+
+    def put(buffer: queue.Queue, value: tuple) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(value, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def drain(item: _T, buffer: queue.Queue) -> None:
+        try:
+            for element in func(item):
+                if not put(buffer, (element, None)):
+                    return
+        except BaseException as ex:  # noqa: BLE001
+            put(buffer, (_END, ex))
+        else:
+            put(buffer, (_END, None))
+
+    def read(buffer: queue.Queue) -> t.Iterator[_R]:
+        while True:
+            element, error = buffer.get()
+            if element is _END:
+                if error is not None:
+                    raise error
+                return
+            yield element
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def start(item: _T) -> tuple[_T, queue.Queue]:
+            buffer: queue.Queue = queue.Queue(maxsize=buffer_size)
+            executor.submit(drain, item, buffer)
+            return item, buffer
+
+        pending = deque(start(item) for item in itertools.islice(items, max_workers))
+        try:
+            while pending:
+                item, buffer = pending[0]
+                elements = read(buffer)
+                yield item, elements
+                # Make sure the item is fully consumed before releasing its slot.
+                for _ in elements:
+                    pass
+                pending.popleft()
+                for next_item in itertools.islice(items, 1):
+                    pending.append(start(next_item))
+        finally:
+            stop.set()
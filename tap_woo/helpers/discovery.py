@@ -0,0 +1,139 @@
+"""Discovery catalogs cached on disk between runs.
+
+This module only uses the standard library, so the command line entry point
+can answer `--discover` from the cache without importing the SDK.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import typing as t
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+def tap_version() -> str:
+    """Return the installed version of the tap."""
+    try:
+        return version("tap-woo")
+    except PackageNotFoundError:  # pragma: no cover - running from a checkout
+        return "0+unknown"
+
+
+def store_id(store: t.Mapping[str, t.Any]) -> str:
+    """Return the id of a store of the `stores` setting, its host by default."""
+    return store.get("store_id") or urlparse(store["api_url"]).netloc
+
+
+def configured_stream_types(
+    config: t.Mapping[str, t.Any],
+) -> t.Optional[dict[str, str]]:
+    """Return the stream classes picked for a config, None if the store must be probed.
+
+    With `bulk_refunds` and `derived` subscription orders, the tap checks
+    whether the store supports them, except with `stores` where each store is
+    probed on its own.
+    """
+    bulk_refunds = bool(config.get("bulk_refunds"))
+    derived = config.get("subscription_orders_mode") == "derived"
+    if (bulk_refunds or derived) and not config.get("stores"):
+        return None
+    return {
+        "refunds": "BulkRefundsStream" if bulk_refunds else "RefundsStream",
+        "subscription_orders": (
+            "DerivedSubscriptionOrdersStream" if derived else "SubscriptionOrdersStream"
+        ),
+    }
+
+
+def catalog_settings(
+    config: t.Mapping[str, t.Any], stream_types: t.Mapping[str, str]
+) -> dict:
+    """Return what changes the discovered catalog, as the tap reads it."""
+    return {
+        "store_ids": sorted(store_id(store) for store in config.get("stores") or []),
+        "deletion_sweep": bool(config.get("deletion_sweep_dir")),
+        "stream_types": dict(stream_types),
+    }
+
+
+def catalog_cache_path(
+    config: t.Mapping[str, t.Any], stream_types: t.Mapping[str, str]
+) -> t.Optional[Path]:
+    """Return the cached catalog file for a config, None without a cache directory.
+
+    The file name holds the tap version and a digest of `catalog_settings`, so
+    upgrading the tap or changing one of those settings discovers again.
+    """
+    directory = config.get("catalog_cache_dir")
+    if not directory:
+        return None
+    settings = json.dumps(catalog_settings(config, stream_types), sort_keys=True)
+    digest = hashlib.sha256(settings.encode()).hexdigest()[:16]
+    return Path(directory) / f"catalog-{tap_version()}-{digest}.json"
+
+
+def load_catalog_text(path: Path) -> t.Optional[str]:
+    """Return the catalog JSON saved at ``path``, or None if there is none."""
+    try:
+        return path.read_text()
+    except FileNotFoundError:
+        return None
+
+
+def save_catalog_text(path: Path, text: str) -> None:
+    """Save catalog JSON atomically, so concurrent runs never read a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, suffix=".tmp", delete=False
+    ) as tmp:
+        tmp.write(text)
+    os.replace(tmp.name, path)
+
+
+def _config_from_args(args: t.Sequence[str]) -> t.Optional[dict]:
+    """Return the merged config of a `--discover` command line.
+
+    Returns None unless the arguments are only `--discover` and `--config`
+    files, which are the invocations the cache can answer.
+    """
+    config: dict = {}
+    discover = False
+    arguments = iter(args)
+    for argument in arguments:
+        if argument == "--discover":
+            discover = True
+            continue
+        if argument == "--config":
+            path = next(arguments, None)
+        elif argument.startswith("--config="):
+            path = argument[len("--config=") :]
+        else:
+            return None
+        if not path or path == "ENV":
+            return None
+        try:
+            config.update(json.loads(Path(path).read_text()))
+        except (OSError, ValueError):
+            # Let the tap report unreadable config files.
+            return None
+    return config if discover else None
+
+
+def cached_discovery(args: t.Sequence[str]) -> t.Optional[str]:
+    """Return the cached catalog answering a command line, if there is one."""
+    config = _config_from_args(args)
+    if config is None:
+        return None
+    types = configured_stream_types(config)
+    if types is None:
+        # Only the tap can probe the store, so let it read the cache itself.
+        return None
+    path = catalog_cache_path(config, types)
+    if path is None:
+        return None
+    return load_catalog_text(path)
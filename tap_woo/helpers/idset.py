@@ -0,0 +1,49 @@
+"""Compact sets of record ids persisted between runs."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import typing as t
+import zlib
+from array import array
+from pathlib import Path
+
+
+def load_ids(path: str | os.PathLike) -> t.Optional[array]:
+    """Return the sorted ids saved at ``path``, or None if there are none."""
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+    ids = array("Q")
+    ids.frombytes(zlib.decompress(data))
+    # Ids are stored as deltas from the previous id.
+    total = 0
+    for index, delta in enumerate(ids):
+        total += delta
+        ids[index] = total
+    return ids
+
+
+def save_ids(path: str | os.PathLike, ids: t.Iterable[int]) -> None:
+    """Save ids as sorted, delta-encoded and compressed unsigned integers."""
+    ids = sorted(set(ids))
+    deltas = array("Q", (b - a for a, b in zip([0, *ids], ids)))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+        tmp.write(zlib.compress(deltas.tobytes(), 6))
+    os.replace(tmp.name, path)
+
+
+def missing_ids(previous: t.Sequence[int], current: t.Sequence[int]) -> list[int]:
+    """Return the ids of ``previous`` missing from ``current``, both sorted."""
+    missing = []
+    position, count = 0, len(current)
+    for id_ in previous:
+        while position < count and current[position] < id_:
+            position += 1
+        if position == count or current[position] != id_:
+            missing.append(id_)
+    return missing
@@ -0,0 +1,77 @@
+"""Incremental parsing of JSON array responses."""
+
+from __future__ import annotations
+
+import codecs
+import json
+import typing as t
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(chunks: t.Iterable[bytes]) -> t.Iterator[t.Any]:
+    """Yield the elements of a top-level JSON array as its bytes arrive.
+
+    Only the bytes of the element being decoded are kept in memory, so a page
+    of records can be processed while the rest of the body is still being read.
+
+    Args:
+        chunks: The raw body, e.g. from `requests.Response.iter_content`.
+
+    Yields:
+        Each element of the array.
+
+    Raises:
+        ValueError: If the body is not a complete JSON array.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    expecting = "["
+    for chunk in chunks:
+        buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position == len(buffer):
+                break
+
+            if expecting == "[":
+                if buffer[position] != "[":
+                    msg = "Expected a JSON array"
+                    raise ValueError(msg)
+                position += 1
+                expecting = "first"
+            elif expecting in ("first", "value"):
+                if expecting == "first" and buffer[position] == "]":
+                    position += 1
+                    expecting = "end"
+                    continue
+                try:
+                    element, end = _DECODER.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break  # Incomplete element, wait for more bytes.
+                if end == len(buffer) and not isinstance(element, (dict, list)):
+                    break  # A scalar may continue in the next chunk.
+                position = end
+                expecting = ","
+                yield element
+            elif expecting == ",":
+                separator = buffer[position]
+                position += 1
+                if separator == "]":
+                    expecting = "end"
+                elif separator != ",":
+                    msg = f"Unexpected {separator!r} in JSON array"
+                    raise ValueError(msg)
+                else:
+                    expecting = "value"
+            else:
+                msg = "Unexpected data after JSON array"
+                raise ValueError(msg)
+
+    if expecting != "end":
+        msg = "Truncated JSON array"
+        raise ValueError(msg)
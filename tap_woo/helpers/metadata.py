@@ -0,0 +1,107 @@
+"""Filtering of `meta_data` entries before records are processed."""
+
+from __future__ import annotations
+
+import fnmatch
+import json
+import re
+import typing as t
+
+
+class MetaDataFilter:
+    """Keep allowlisted `meta_data` entries and cap the size of their values.
+
+    The filter applies to the record's own `meta_data` and to the `meta_data`
+    of any nested line (line items, coupon lines, ...), matching the places
+    where `METADATA_FIELD_SCHEMA` is used.
+    """
+
+    def __init__(
+        self,
+        keys: t.Sequence[str] | None = None,
+        max_value_bytes: int | None = None,
+        oversized_values: str = "truncate",
+        always_keep: t.Sequence[str] = (),
+    ) -> None:
+        """Create a new filter.
+
+        Args:
+            keys: Glob patterns of the meta keys to keep, or None to keep all.
+            max_value_bytes: Maximum size of a value once serialized.
+            oversized_values: `truncate` or `drop` string values above the maximum
+                size. Larger arrays and objects are always dropped.
+            always_keep: Meta keys the tap reads, kept whole whatever the rest.
+        """
+        self._key_pattern: re.Pattern | None = None
+        if keys is not None:
+            # An empty allowlist keeps no entry, so it matches no key.
+            self._key_pattern = re.compile(
+                "|".join(fnmatch.translate(key) for key in keys) if keys else "(?!)"
+            )
+        self._max_value_bytes = max_value_bytes
+        self._drop_oversized = oversized_values == "drop"
+        self._always_keep = frozenset(always_keep)
+
+    @classmethod
+    def from_config(
+        cls, config: t.Mapping[str, t.Any] | None, always_keep: t.Sequence[str] = ()
+    ) -> MetaDataFilter | None:
+        """Build a filter from a stream's `meta_data_filters` entry."""
+        if not config:
+            return None
+        keys = config.get("keys")
+        return cls(
+            keys=keys,
+            max_value_bytes=config.get("max_value_bytes"),
+            oversized_values=config.get("oversized_values") or "truncate",
+            always_keep=always_keep,
+        )
+
+    def __call__(self, record: dict) -> dict:
+        """Filter the record's `meta_data` in place and return the record."""
+        if "meta_data" in record:
+            record["meta_data"] = self.filter_entries(record["meta_data"])
+        for value in record.values():
+            if isinstance(value, list):
+                for line in value:
+                    if isinstance(line, dict) and "meta_data" in line:
+                        line["meta_data"] = self.filter_entries(line["meta_data"])
+        return record
+
+    def filter_entries(self, entries: list[dict] | None) -> list[dict] | None:
+        """Return the entries to keep, with their values capped."""
+        if not entries:
+            return entries
+
+        kept = []
+        for entry in entries:
+            key = entry.get("key")
+            if key in self._always_keep:
+                kept.append(entry)
+                continue
+            if self._key_pattern is not None and not (
+                key and self._key_pattern.match(key)
+            ):
+                continue
+            if self._max_value_bytes is not None and not self._cap_value(entry):
+                continue
+            kept.append(entry)
+        return kept
+
+    def _cap_value(self, entry: dict) -> bool:
+        """Truncate an oversized value, returning False if it should be dropped.
+
+        Only strings are truncated: a cut array or object would be neither
+        its type nor valid JSON, so those are dropped whatever the setting.
+        """
+        value = entry.get("value")
+        if isinstance(value, str):
+            encoded = value.encode()
+        else:
+            encoded = json.dumps(value, separators=(",", ":")).encode()
+        if len(encoded) <= self._max_value_bytes:
+            return True
+        if self._drop_oversized or not isinstance(value, str):
+            return False
+        entry["value"] = encoded[: self._max_value_bytes].decode(errors="ignore")
+        return True
@@ -0,0 +1,118 @@
+"""Singer metrics specific to tap-woo."""
+
+from __future__ import annotations
+
+import bisect
+import enum
+import threading
+from collections import Counter
+
+from singer_sdk import metrics
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds of the records per page histogram buckets.
+PAGE_RECORD_BUCKETS = (0, 1, 10, 25, 50, 75, 100)
+
+
+class WooMetric(str, enum.Enum):
+    """Metric types logged by tap-woo in addition to the SDK's own."""
+
+    SKIPPED_REQUEST_COUNT = "skipped_http_request_count"
+    PAGE_SIZE = "page_size"
+    REQUEST_LATENCY = "http_request_latency"
+    RESPONSE_BYTES = "http_response_bytes"
+    RETRY_COUNT = "http_retry_count"
+    CACHE_HIT_COUNT = "http_cache_hit_count"
+    DELETED_RECORD_COUNT = "deleted_record_count"
+    RATE_LIMIT_WAIT = "rate_limit_wait_duration"
+    RECORDS_PER_PAGE = "records_per_page"
+    PARSE_TIME = "parse_duration"
+    POST_PROCESS_TIME = "post_process_duration"
+    CONFORM_TIME = "conform_duration"
+
+
+class Histogram:
+    """Count observations into fixed buckets."""
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        """Return the histogram as cumulative `le` buckets, Prometheus style."""
+        cumulative, buckets = 0, {}
+        for bound, count in zip((*self.bounds, "+Inf"), self.buckets):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class StreamMetrics:
+    """Hot-path measurements of a stream, safe to update from worker threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.records_per_page = Histogram(PAGE_RECORD_BUCKETS)
+        self.counters: Counter = Counter()
+        self.timers: Counter = Counter()
+
+    def observe_request(self, latency: float, waited: float) -> None:
+        """Record a response's latency and the rate limiter wait before it."""
+        with self._lock:
+            self.latency.observe(latency)
+            self.timers[WooMetric.RATE_LIMIT_WAIT] += waited
+
+    def observe_page(self, records: int, size: int, parse_time: float) -> None:
+        """Record a parsed page."""
+        with self._lock:
+            self.records_per_page.observe(records)
+            self.counters[WooMetric.RESPONSE_BYTES] += size
+            self.timers[WooMetric.PARSE_TIME] += parse_time
+
+    def increment(self, metric: WooMetric, value: float = 1) -> None:
+        with self._lock:
+            self.counters[metric] += value
+
+    def add_time(self, metric: WooMetric, seconds: float) -> None:
+        with self._lock:
+            self.timers[metric] += seconds
+
+    def points(self, tags: dict) -> list[metrics.Point]:
+        """Return the metrics collected so far as Singer metric points."""
+        with self._lock:
+            points = [
+                metrics.Point(
+                    "histogram", WooMetric.REQUEST_LATENCY, self.latency.to_dict(), tags
+                ),
+                metrics.Point(
+                    "histogram",
+                    WooMetric.RECORDS_PER_PAGE,
+                    self.records_per_page.to_dict(),
+                    tags,
+                ),
+            ]
+            points.extend(
+                metrics.Point("counter", metric, value, tags)
+                for metric, value in self.counters.items()
+            )
+            points.extend(
+                metrics.Point("timer", metric, value, tags)
+                for metric, value in self.timers.items()
+            )
+        return points
@@ -0,0 +1,92 @@
+"""Buffered Singer message output."""
+
+from __future__ import annotations
+
+import datetime
+import decimal
+import sys
+import typing as t
+
+import simplejson
+from singer_sdk._singerlib import Message, RecordMessage, SingerMessageType
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def _default(value: t.Any) -> t.Any:
+    """Encode the values the JSON encoder does not know, like the SDK does."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep="T")
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+def dumps(value: t.Any) -> bytes:
+    """Encode a value as compact JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return simplejson.dumps(
+        value, use_decimal=True, default=_default, separators=(",", ":")
+    ).encode()
+
+
+class MessageWriter:
+    """Write Singer messages to stdout through a large buffer.
+
+    RECORD messages are encoded into a per-stream envelope built once, so only
+    the record and its extraction time are encoded per message. The buffer is
+    flushed once it holds ``buffer_size`` bytes and after every STATE message,
+    so a state is never emitted before the records it covers nor held back.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        self.buffer_size = buffer_size
+        self._chunks: list[bytes] = []
+        self._size = 0
+        self._envelopes: dict[str, bytes] = {}
+
+    def encode(self, message: Message) -> bytes:
+        """Return a message as a JSON line."""
+        if type(message) is not RecordMessage:
+            return dumps(message.to_dict()) + b"\n"
+        envelope = self._envelopes.get(message.stream)
+        if envelope is None:
+            envelope = b'{"type":"RECORD","stream":%s,"record":' % dumps(message.stream)
+            self._envelopes[message.stream] = envelope
+        line = [envelope, dumps(message.record)]
+        if message.version is not None:
+            line.append(b',"version":%s' % dumps(message.version))
+        if message.time_extracted is not None:
+            line.append(b',"time_extracted":%s' % dumps(message.time_extracted))
+        line.append(b"}\n")
+        return b"".join(line)
+
+    def write(self, message: Message) -> None:
+        """Buffer a message, flushing if needed."""
+        line = self.encode(message)
+        self._chunks.append(line)
+        self._size += len(line)
+        if self._size >= self.buffer_size or message.type == SingerMessageType.STATE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered messages to stdout."""
+        if not self._chunks:
+            return
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self._size = 0
+        output = sys.stdout
+        if hasattr(output, "buffer"):
+            output.flush()
+            output.buffer.write(data)
+            output.buffer.flush()
+        else:
+            output.write(data.decode())
+            output.flush()
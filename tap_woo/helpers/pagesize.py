@@ -0,0 +1,67 @@
+"""Adaptive page sizing."""
+
+from __future__ import annotations
+
+import math
+import threading
+
+
+class PageSizeController:
+    """Adapt a stream's page size to the latency and errors it observes.
+
+    The size is halved after a timeout or server error, reduced when a page
+    takes longer than the target latency, and grown again while pages come
+    back in less than half of it, always staying within the given bounds.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+    ) -> None:
+        """Create a new controller.
+
+        Args:
+            initial: Page size to start with.
+            minimum: Smallest page size to use.
+            maximum: Largest page size the API accepts.
+            target_latency: Desired response time of a page, in seconds.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self._size = min(max(initial, minimum), maximum)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Return the page size to request next."""
+        return self._size
+
+    def record_success(self, latency: float) -> bool:
+        """Adjust the size after a successful page.
+
+        Returns:
+            True if the page size changed.
+        """
+        if latency > self.target_latency:
+            return self._resize(math.floor(self._size * 0.75))
+        if latency < self.target_latency / 2:
+            return self._resize(math.ceil(self._size * 1.25))
+        return False
+
+    def record_failure(self) -> bool:
+        """Shrink the size after a timeout or server error.
+
+        Returns:
+            True if the page size changed.
+        """
+        return self._resize(self._size // 2)
+
+    def _resize(self, size: int) -> bool:
+        with self._lock:
+            size = min(max(size, self.minimum), self.maximum)
+            changed, self._size = size != self._size, size
+        return changed
@@ -0,0 +1,127 @@
+"""Request rate limiting shared by all the tap's streams."""
+
+from __future__ import annotations
+
+import email.utils
+import threading
+import time
+import typing as t
+
+import requests
+
+# The rate never drops below this fraction of the configured one.
+MIN_RATE_FRACTION = 0.1
+# Fraction of the configured rate recovered after each successful request.
+RECOVERY_STEP = 0.05
+
+
+def retry_after_seconds(response: requests.Response) -> t.Optional[float]:
+    """Return the delay requested by a response's `Retry-After` header.
+
+    The header is either a number of seconds or an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RateLimiter:
+    """A thread-safe token bucket.
+
+    Requests are let through at ``rate`` per second on average, with up to
+    ``burst`` of them back to back. A throttling response halves the effective
+    rate, which then climbs back to ``rate`` as requests succeed, and a
+    `Retry-After` delay holds every caller until it has passed. Without a
+    ``rate`` only those delays are applied.
+    """
+
+    def __init__(
+        self,
+        rate: t.Optional[float] = None,
+        burst: int = 1,
+        clock: t.Callable[[], float] = time.monotonic,
+        sleep: t.Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Create a new limiter.
+
+        Args:
+            rate: Requests per second, unlimited if None.
+            burst: Number of requests that may be sent without waiting.
+            clock: Monotonic clock, in seconds.
+            sleep: Function used to wait.
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._current_rate = rate
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._resume_at = 0.0
+
+    @property
+    def current_rate(self) -> t.Optional[float]:
+        """Return the effective rate, lowered after throttling responses."""
+        return self._current_rate
+
+    def acquire(self) -> float:
+        """Wait until a request may be sent.
+
+        Returns:
+            The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                wait = self._reserve()
+            if not wait:
+                return waited
+            self._sleep(wait)
+            waited += wait
+
+    def _reserve(self) -> float:
+        now = self._clock()
+        if now < self._resume_at:
+            return self._resume_at - now
+        if self._current_rate is None:
+            return 0.0
+        elapsed, self._updated = now - self._updated, now
+        self._tokens = min(self.burst, self._tokens + elapsed * self._current_rate)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self._current_rate
+
+    def throttle(self, retry_after: t.Optional[float] = None) -> None:
+        """Slow down after the server asked us to.
+
+        Args:
+            retry_after: Seconds to hold all requests for, if the server said.
+        """
+        with self._lock:
+            if retry_after:
+                self._resume_at = max(self._resume_at, self._clock() + retry_after)
+            if self.rate is not None:
+                self._current_rate = max(
+                    self._current_rate / 2, self.rate * MIN_RATE_FRACTION
+                )
+                self._tokens = 0.0
+
+    def recover(self) -> None:
+        """Move the effective rate back towards the configured one."""
+        if self.rate is None or self._current_rate >= self.rate:
+            return
+        with self._lock:
+            self._current_rate = min(
+                self.rate, self._current_rate + self.rate * RECOVERY_STEP
+            )
@@ -0,0 +1,23 @@
+"""Stream schemas built on first use."""
+
+from __future__ import annotations
+
+import typing as t
+
+
+class LazySchema:
+    """Class attribute building a stream schema the first time it is read.
+
+    Decorates a function returning the schema, so the `singer_sdk.typing`
+    objects are only turned into JSON schema for the streams a run actually
+    creates. Instances may still assign their own `schema`, which shadows it.
+    """
+
+    def __init__(self, build: t.Callable[[], dict]) -> None:
+        self.build = build
+        self._schema: t.Optional[dict] = None
+
+    def __get__(self, instance: t.Any, owner: t.Optional[type] = None) -> dict:
+        if self._schema is None:
+            self._schema = self.build()
+        return self._schema
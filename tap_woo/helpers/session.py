@@ -0,0 +1,37 @@
+"""HTTP session setup."""
+
+from __future__ import annotations
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:  # urllib3 only decodes brotli bodies when a brotli package is installed.
+    import brotli  # noqa: F401
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+    else:
+        ACCEPT_ENCODING = "gzip, deflate, br"
+else:
+    ACCEPT_ENCODING = "gzip, deflate, br"
+
+
+def build_session(pool_size: int, stream: bool = False) -> requests.Session:
+    """Return a keep-alive session able to hold ``pool_size`` connections per host.
+
+    Args:
+        pool_size: Number of connections kept open per host, which should match
+            the number of requests that can be in flight at once.
+        stream: Whether response bodies are read incrementally.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {"Accept-Encoding": ACCEPT_ENCODING, "Connection": "keep-alive"}
+    )
+    session.stream = stream
+    return session
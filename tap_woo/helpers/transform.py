@@ -0,0 +1,154 @@
+"""Compiled record transformation against a stream schema."""
+
+from __future__ import annotations
+
+import logging
+import typing as t
+
+from singer_sdk._singerlib import SelectionMask
+
+# Python types accepted for each JSON schema type.
+JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list, tuple),
+    "null": (type(None),),
+}
+
+# Returned by converters for values that are left out of the record.
+_DROP = object()
+
+Converter = t.Callable[[t.Any, str], t.Any]
+
+
+def schema_types(schema: dict) -> list[str]:
+    """Return the JSON types a schema allows, including those of `anyOf`."""
+    types = schema.get("type", [])
+    if isinstance(types, str):
+        return [types]
+    if not types and "anyOf" in schema:
+        return [name for option in schema["anyOf"] for name in schema_types(option)]
+    return list(types)
+
+
+class RecordTransformer:
+    """Conform, validate and clean records of a stream in a single pass.
+
+    The schema and selection mask are compiled once into a tree of converters,
+    so each record is walked once instead of once per concern. For every value
+    the transformer:
+
+    - drops properties that are not selected, and those missing from the
+      schema with a single warning per property;
+    - drops empty date-time strings, which WooCommerce sends for unset dates;
+    - converts booleans the way the SDK's type conformance does;
+    - checks the value against the schema types, logging a warning the first
+      time a property does not match.
+    """
+
+    def __init__(
+        self,
+        stream_name: str,
+        schema: dict,
+        mask: SelectionMask,
+        logger: logging.Logger,
+    ) -> None:
+        self.stream_name = stream_name
+        self.logger = logger
+        self._warned: set[str] = set()
+        self._transform = self._compile_object(schema, mask, ())
+
+    def __call__(self, record: dict) -> dict:
+        """Return the transformed record."""
+        return self._transform(record, "")
+
+    def _warn_once(self, path: str, message: str, *args: t.Any) -> None:
+        if path not in self._warned:
+            self._warned.add(path)
+            self.logger.warning(message, *args)
+
+    def _compile_object(
+        self, schema: dict, mask: SelectionMask, breadcrumb: tuple[str, ...]
+    ) -> Converter:
+        converters: dict[str, Converter] = {}
+        deselected: set[str] = set()
+        for name, property_schema in schema.get("properties", {}).items():
+            property_breadcrumb = (*breadcrumb, "properties", name)
+            if not mask[property_breadcrumb]:
+                deselected.add(name)
+                continue
+            converters[name] = self._compile(property_schema, mask, property_breadcrumb)
+
+        def transform(record: dict, parent: str) -> dict:
+            output = {}
+            for name, value in record.items():
+                converter = converters.get(name)
+                if converter is None:
+                    if name not in deselected:
+                        path = f"{parent}{name}"
+                        self._warn_once(
+                            path,
+                            "Property '%s' was present in the '%s' stream but not "
+                            "found in catalog schema. Ignoring.",
+                            path,
+                            self.stream_name,
+                        )
+                    continue
+                value = converter(value, f"{parent}{name}")
+                if value is not _DROP:
+                    output[name] = value
+            return output
+
+        return transform
+
+    def _compile(
+        self, schema: dict, mask: SelectionMask, breadcrumb: tuple[str, ...]
+    ) -> Converter:
+        types = schema_types(schema)
+        accepted = tuple(
+            python_type for name in types for python_type in JSON_TYPES.get(name, ())
+        )
+        is_boolean = "boolean" in types
+        is_datetime = schema.get("format") == "date-time"
+        items = schema.get("items")
+
+        convert_object = None
+        if "object" in types and "properties" in schema:
+            convert_object = self._compile_object(schema, mask, breadcrumb)
+        convert_item = None
+        if "array" in types and isinstance(items, dict) and "prefixItems" not in schema:
+            convert_item = self._compile(items, mask, breadcrumb)
+
+        def convert(value: t.Any, path: str) -> t.Any:
+            if is_datetime and value == "":
+                return _DROP
+            if isinstance(value, dict):
+                if convert_object is not None:
+                    return convert_object(value, f"{path}.")
+            elif isinstance(value, list):
+                if convert_item is not None:
+                    return [
+                        item
+                        for item in (convert_item(item, path) for item in value)
+                        if item is not _DROP
+                    ]
+            elif is_boolean and not isinstance(value, bool) and value is not None:
+                return value != 0
+            if accepted and (
+                not isinstance(value, accepted)
+                or (isinstance(value, bool) and bool not in accepted)
+            ):
+                self._warn_once(
+                    path,
+                    "Property '%s' of the '%s' stream has a %s value, expected %s.",
+                    path,
+                    self.stream_name,
+                    type(value).__name__,
+                    "/".join(types),
+                )
+            return value
+
+        return convert
@@ -5,9 +5,11 @@ from __future__ import annotations
 import typing as t
 from typing import Optional
 
+import pendulum
 from singer_sdk import typing as th  # JSON Schema typing helpers
+from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
 
-from tap_woo.client import wooStream
+from tap_woo.client import STORE_ID_PROPERTY, wooStream
 from tap_woo.helpers.common_fields import (
     BILLING_FIELD_SCHEMA,
     SHIPPING_FIELD_SCHEMA,
@@ -18,6 +20,23 @@ from tap_woo.helpers.common_fields import (
     LINE_ITEMS_FIELD_SCHEMA,
     LINKS_FIELD_SCHEMA,
 )
+from tap_woo.helpers.schema import LazySchema
+
+# Subscription meta caching the ids of renewal, resubscribe and switch orders.
+RELATED_ORDERS_META_KEYS = (
+    "_subscription_renewal_order_ids_cache",
+    "_subscription_resubscribe_order_ids_cache",
+    "_subscription_switch_order_ids_cache",
+)
+
+
+def related_order_ids(subscription: dict) -> list[int]:
+    """Return the ids of the orders related to a subscription."""
+    order_ids = [subscription["parent_id"]] if subscription.get("parent_id") else []
+    for meta in subscription.get("meta_data") or []:
+        if meta.get("key") in RELATED_ORDERS_META_KEYS and meta.get("value"):
+            order_ids.extend(int(order_id) for order_id in meta["value"])
+    return order_ids
 
 
 class OrdersStream(wooStream):
@@ -27,77 +46,81 @@ class OrdersStream(wooStream):
     path = "/orders"
     primary_keys: t.ClassVar[list[str]] = ["id"]
     replication_key = "date_modified_gmt"
-    is_sorted = False
-
-    schema = th.PropertiesList(
-        th.Property("id", th.IntegerType),
-        th.Property("parent_id", th.IntegerType),
-        th.Property("number", th.StringType),
-        th.Property("order_key", th.StringType),
-        th.Property("created_via", th.StringType),
-        th.Property("version", th.StringType),
-        th.Property("status", th.StringType),
-        th.Property("currency", th.StringType),
-        th.Property("currency_symbol", th.StringType),
-        th.Property("date_created", th.DateTimeType),
-        th.Property("date_created_gmt", th.DateTimeType),
-        th.Property("date_modified", th.DateTimeType),
-        th.Property("date_modified_gmt", th.DateTimeType),
-        th.Property("discount_total", th.StringType),
-        th.Property("discount_tax", th.StringType),
-        th.Property("shipping_total", th.StringType),
-        th.Property("shipping_tax", th.StringType),
-        th.Property("cart_tax", th.StringType),
-        th.Property("total", th.StringType),
-        th.Property("total_tax", th.StringType),
-        th.Property("prices_include_tax", th.BooleanType),
-        th.Property("customer_id", th.IntegerType),
-        th.Property("customer_ip_address", th.StringType),
-        th.Property("customer_user_agent", th.StringType),
-        th.Property("customer_note", th.StringType),
-        BILLING_FIELD_SCHEMA,
-        SHIPPING_FIELD_SCHEMA,
-        th.Property("payment_method", th.StringType),
-        th.Property("payment_method_title", th.StringType),
-        th.Property("transaction_id", th.StringType),
-        th.Property("date_paid", th.DateTimeType),
-        th.Property("date_paid_gmt", th.DateTimeType),
-        th.Property("date_completed", th.DateTimeType),
-        th.Property("date_completed_gmt", th.DateTimeType),
-        th.Property("cart_hash", th.StringType),
-        LINE_ITEMS_FIELD_SCHEMA,
-        TAX_LINES_FIELD_SCHEMA,
-        SHIPPING_LINES_FIELD_SCHEMA,
-        FEE_LINES_FIELD_SCHEMA,
-        th.Property(
-            "coupon_lines",
-            th.ArrayType(
-                th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("code", th.StringType),
-                    th.Property("discount", th.StringType),
-                    th.Property("discount_tax", th.StringType),
-                    METADATA_FIELD_SCHEMA,
+    supports_time_slicing = True
+    supports_deletion_sweep = True
+    child_context_fields = ("refunds",)
+
+    @LazySchema
+    def schema() -> dict:
+        return th.PropertiesList(
+            th.Property("id", th.IntegerType),
+            th.Property("parent_id", th.IntegerType),
+            th.Property("number", th.StringType),
+            th.Property("order_key", th.StringType),
+            th.Property("created_via", th.StringType),
+            th.Property("version", th.StringType),
+            th.Property("status", th.StringType),
+            th.Property("currency", th.StringType),
+            th.Property("currency_symbol", th.StringType),
+            th.Property("date_created", th.DateTimeType),
+            th.Property("date_created_gmt", th.DateTimeType),
+            th.Property("date_modified", th.DateTimeType),
+            th.Property("date_modified_gmt", th.DateTimeType),
+            th.Property("discount_total", th.StringType),
+            th.Property("discount_tax", th.StringType),
+            th.Property("shipping_total", th.StringType),
+            th.Property("shipping_tax", th.StringType),
+            th.Property("cart_tax", th.StringType),
+            th.Property("total", th.StringType),
+            th.Property("total_tax", th.StringType),
+            th.Property("prices_include_tax", th.BooleanType),
+            th.Property("customer_id", th.IntegerType),
+            th.Property("customer_ip_address", th.StringType),
+            th.Property("customer_user_agent", th.StringType),
+            th.Property("customer_note", th.StringType),
+            BILLING_FIELD_SCHEMA,
+            SHIPPING_FIELD_SCHEMA,
+            th.Property("payment_method", th.StringType),
+            th.Property("payment_method_title", th.StringType),
+            th.Property("transaction_id", th.StringType),
+            th.Property("date_paid", th.DateTimeType),
+            th.Property("date_paid_gmt", th.DateTimeType),
+            th.Property("date_completed", th.DateTimeType),
+            th.Property("date_completed_gmt", th.DateTimeType),
+            th.Property("cart_hash", th.StringType),
+            LINE_ITEMS_FIELD_SCHEMA,
+            TAX_LINES_FIELD_SCHEMA,
+            SHIPPING_LINES_FIELD_SCHEMA,
+            FEE_LINES_FIELD_SCHEMA,
+            th.Property(
+                "coupon_lines",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("code", th.StringType),
+                        th.Property("discount", th.StringType),
+                        th.Property("discount_tax", th.StringType),
+                        METADATA_FIELD_SCHEMA,
+                    ),
                 ),
             ),
-        ),
-        METADATA_FIELD_SCHEMA,
-        th.Property(
-            "refunds",
-            th.ArrayType(
-                th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("reason", th.StringType),
-                    th.Property("total", th.StringType),
-                )
+            METADATA_FIELD_SCHEMA,
+            th.Property(
+                "refunds",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("reason", th.StringType),
+                        th.Property("total", th.StringType),
+                    )
+                ),
             ),
-        ),
-        th.Property("payment_url", th.StringType),
-        th.Property("is_editable", th.BooleanType),
-        th.Property("needs_payment", th.BooleanType),
-        th.Property("needs_processing", th.BooleanType),
-        LINKS_FIELD_SCHEMA,
-    ).to_dict()
+            th.Property("payment_url", th.StringType),
+            th.Property("is_editable", th.BooleanType),
+            th.Property("needs_payment", th.BooleanType),
+            th.Property("needs_processing", th.BooleanType),
+            LINKS_FIELD_SCHEMA,
+        ).to_dict()
 
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
@@ -105,6 +128,15 @@ class OrdersStream(wooStream):
             "order_id": record["id"],
         }
 
+    def generate_child_contexts(
+        self, record: dict, context: Optional[dict]
+    ) -> t.Iterable[Optional[dict]]:
+        """Generate child contexts, skipping orders without refunds."""
+        if "refunds" in record and not record["refunds"]:
+            self.skip_child_requests()
+            return
+        yield from super().generate_child_contexts(record, context)
+
 
 class RefundsStream(wooStream):
     name = "refunds"
@@ -113,22 +145,24 @@ class RefundsStream(wooStream):
     parent_stream_type = OrdersStream
     state_partitioning_keys: list[str] = []
 
-    schema = th.PropertiesList(
-        th.Property("id", th.IntegerType),
-        th.Property("original_order_id", th.IntegerType),
-        th.Property("date_created", th.DateTimeType),
-        th.Property("date_created_gmt", th.DateTimeType),
-        th.Property("amount", th.StringType),
-        th.Property("reason", th.StringType),
-        th.Property("refunded_by", th.IntegerType),
-        th.Property("refunded_payment", th.BooleanType),
-        METADATA_FIELD_SCHEMA,
-        LINE_ITEMS_FIELD_SCHEMA,
-        SHIPPING_LINES_FIELD_SCHEMA,
-        TAX_LINES_FIELD_SCHEMA,
-        FEE_LINES_FIELD_SCHEMA,
-        LINKS_FIELD_SCHEMA,
-    ).to_dict()
+    @LazySchema
+    def schema() -> dict:
+        return th.PropertiesList(
+            th.Property("id", th.IntegerType),
+            th.Property("original_order_id", th.IntegerType),
+            th.Property("date_created", th.DateTimeType),
+            th.Property("date_created_gmt", th.DateTimeType),
+            th.Property("amount", th.StringType),
+            th.Property("reason", th.StringType),
+            th.Property("refunded_by", th.IntegerType),
+            th.Property("refunded_payment", th.BooleanType),
+            METADATA_FIELD_SCHEMA,
+            LINE_ITEMS_FIELD_SCHEMA,
+            SHIPPING_LINES_FIELD_SCHEMA,
+            TAX_LINES_FIELD_SCHEMA,
+            FEE_LINES_FIELD_SCHEMA,
+            LINKS_FIELD_SCHEMA,
+        ).to_dict()
 
     def post_process(self, row: dict, context: dict | None = None) -> dict | None:
         # Add in the original order id
@@ -136,6 +170,52 @@ class RefundsStream(wooStream):
         return super().post_process(row, context)
 
 
+class BulkRefundsStream(wooStream):
+    """Refunds Stream, paged from the store-wide refunds listing.
+
+    Used in place of `RefundsStream` when `bulk_refunds` is enabled and the
+    store exposes the `/refunds` endpoint.
+    """
+
+    name = "refunds"
+    path = "/refunds"
+    primary_keys = ["id"]
+    replication_key = "date_created_gmt"
+    required_fields = ("id", "parent_id")
+    schema = RefundsStream.__dict__["schema"]
+
+    @property
+    def pagination_mode(self) -> str:
+        """Return the pagination mode, always page offsets for refunds.
+
+        Refunds are filtered on `modified_after` but bookmarked on their
+        creation date, so they cannot be paged with a keyset cursor.
+        """
+        return "offset"
+
+    def is_available(self) -> bool:
+        """Return whether the store exposes the refunds listing endpoint.
+
+        Throttled and failing probes are retried like any request, and only a
+        successful response counts, so a store answering with an error page
+        is synced order by order. Failed probes are not cached.
+        """
+        prepared_request = self.build_prepared_request(
+            method="GET", url=self.get_url(None), params={"per_page": 1}
+        )
+        try:
+            self.request_decorator(self._request)(prepared_request, None)
+        except (FatalAPIError, RetriableAPIError) as ex:
+            self.logger.info("Probing the refunds listing failed: %s", ex)
+            return False
+        return True
+
+    def post_process(self, row: dict, context: dict | None = None) -> dict | None:
+        # The order id is carried by the refund itself
+        row["original_order_id"] = row.pop("parent_id", None)
+        return super().post_process(row, context)
+
+
 class ProductsStream(wooStream):
     """Products Stream."""
 
@@ -143,97 +223,256 @@ class ProductsStream(wooStream):
     path = "/products"
     primary_keys: t.ClassVar[list[str]]
     replication_key = "date_modified_gmt"
-    is_sorted = False
-
-    schema = th.PropertiesList(
-        th.Property("id", th.IntegerType),
-        th.Property("name", th.StringType),
-        th.Property("slug", th.StringType),
-        th.Property("permalink", th.StringType),
-        th.Property("date_created", th.DateTimeType),
-        th.Property("date_modified", th.DateTimeType),
-        th.Property("date_created_gmt", th.DateTimeType),
-        th.Property("date_modified_gmt", th.DateTimeType),
-        th.Property("date_on_sale_from_gmt", th.DateTimeType),
-        th.Property("date_on_sale_to_gmt", th.DateTimeType),
-        th.Property("low_stock_amount", th.StringType),
-        th.Property("type", th.StringType),
-        th.Property("status", th.StringType),
-        th.Property("featured", th.BooleanType),
-        th.Property("catalog_visibility", th.StringType),
-        th.Property("description", th.StringType),
-        th.Property("short_description", th.StringType),
-        th.Property("sku", th.StringType),
-        th.Property("brands", th.ArrayType(th.StringType)),
-        th.Property("price", th.StringType),
-        th.Property("regular_price", th.StringType),
-        th.Property("sale_price", th.StringType),
-        th.Property("date_on_sale_from", th.DateTimeType),
-        th.Property("date_on_sale_to", th.DateTimeType),
-        th.Property("price_html", th.StringType),
-        th.Property("on_sale", th.BooleanType),
-        th.Property("purchasable", th.BooleanType),
-        th.Property("total_sales", th.NumberType),
-        th.Property("virtual", th.BooleanType),
-        th.Property("downloadable", th.BooleanType),
-        th.Property("downloads", th.ArrayType(th.StringType)),
-        th.Property("download_limit", th.IntegerType),
-        th.Property("download_expiry", th.IntegerType),
-        th.Property("external_url", th.StringType),
-        th.Property("button_text", th.StringType),
-        th.Property("tax_status", th.StringType),
-        th.Property("tax_class", th.StringType),
-        th.Property("manage_stock", th.BooleanType),
-        th.Property("stock_quantity", th.NumberType),
-        th.Property("stock_status", th.StringType),
-        th.Property("backorders", th.StringType),
-        th.Property("backorders_allowed", th.BooleanType),
-        th.Property("backordered", th.BooleanType),
-        th.Property("sold_individually", th.BooleanType),
-        th.Property("weight", th.StringType),
-        th.Property(
-            "dimensions",
-            th.ObjectType(
-                th.Property("length", th.StringType),
-                th.Property("width", th.StringType),
-                th.Property("height", th.StringType),
-            ),
-        ),
-        th.Property("shipping_required", th.BooleanType),
-        th.Property("shipping_taxable", th.BooleanType),
-        th.Property("shipping_class", th.StringType),
-        th.Property("shipping_class_id", th.IntegerType),
-        th.Property("reviews_allowed", th.BooleanType),
-        th.Property("average_rating", th.StringType),
-        th.Property("rating_count", th.IntegerType),
-        th.Property("related_ids", th.ArrayType(th.IntegerType)),
-        th.Property("upsell_ids", th.ArrayType(th.IntegerType)),
-        th.Property("cross_sell_ids", th.ArrayType(th.IntegerType)),
-        th.Property("parent_id", th.IntegerType),
-        th.Property("purchase_note", th.StringType),
-        th.Property(
-            "categories",
-            th.ArrayType(
+    supports_deletion_sweep = True
+
+    @LazySchema
+    def schema() -> dict:
+        return th.PropertiesList(
+            th.Property("id", th.IntegerType),
+            th.Property("name", th.StringType),
+            th.Property("slug", th.StringType),
+            th.Property("permalink", th.StringType),
+            th.Property("date_created", th.DateTimeType),
+            th.Property("date_modified", th.DateTimeType),
+            th.Property("date_created_gmt", th.DateTimeType),
+            th.Property("date_modified_gmt", th.DateTimeType),
+            th.Property("date_on_sale_from_gmt", th.DateTimeType),
+            th.Property("date_on_sale_to_gmt", th.DateTimeType),
+            th.Property("low_stock_amount", th.StringType),
+            th.Property("type", th.StringType),
+            th.Property("status", th.StringType),
+            th.Property("featured", th.BooleanType),
+            th.Property("catalog_visibility", th.StringType),
+            th.Property("description", th.StringType),
+            th.Property("short_description", th.StringType),
+            th.Property("sku", th.StringType),
+            th.Property("brands", th.ArrayType(th.StringType)),
+            th.Property("price", th.StringType),
+            th.Property("regular_price", th.StringType),
+            th.Property("sale_price", th.StringType),
+            th.Property("date_on_sale_from", th.DateTimeType),
+            th.Property("date_on_sale_to", th.DateTimeType),
+            th.Property("price_html", th.StringType),
+            th.Property("on_sale", th.BooleanType),
+            th.Property("purchasable", th.BooleanType),
+            th.Property("total_sales", th.NumberType),
+            th.Property("virtual", th.BooleanType),
+            th.Property("downloadable", th.BooleanType),
+            th.Property("downloads", th.ArrayType(th.StringType)),
+            th.Property("download_limit", th.IntegerType),
+            th.Property("download_expiry", th.IntegerType),
+            th.Property("external_url", th.StringType),
+            th.Property("button_text", th.StringType),
+            th.Property("tax_status", th.StringType),
+            th.Property("tax_class", th.StringType),
+            th.Property("manage_stock", th.BooleanType),
+            th.Property("stock_quantity", th.NumberType),
+            th.Property("stock_status", th.StringType),
+            th.Property("backorders", th.StringType),
+            th.Property("backorders_allowed", th.BooleanType),
+            th.Property("backordered", th.BooleanType),
+            th.Property("sold_individually", th.BooleanType),
+            th.Property("weight", th.StringType),
+            th.Property(
+                "dimensions",
                 th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("name", th.StringType),
-                    th.Property("slug", th.StringType),
-                )
+                    th.Property("length", th.StringType),
+                    th.Property("width", th.StringType),
+                    th.Property("height", th.StringType),
+                ),
             ),
-        ),
-        th.Property(
-            "tags",
-            th.ArrayType(
+            th.Property("shipping_required", th.BooleanType),
+            th.Property("shipping_taxable", th.BooleanType),
+            th.Property("shipping_class", th.StringType),
+            th.Property("shipping_class_id", th.IntegerType),
+            th.Property("reviews_allowed", th.BooleanType),
+            th.Property("average_rating", th.StringType),
+            th.Property("rating_count", th.IntegerType),
+            th.Property("related_ids", th.ArrayType(th.IntegerType)),
+            th.Property("upsell_ids", th.ArrayType(th.IntegerType)),
+            th.Property("cross_sell_ids", th.ArrayType(th.IntegerType)),
+            th.Property("parent_id", th.IntegerType),
+            th.Property("purchase_note", th.StringType),
+            th.Property(
+                "categories",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("name", th.StringType),
+                        th.Property("slug", th.StringType),
+                    )
+                ),
+            ),
+            th.Property(
+                "tags",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("name", th.StringType),
+                        th.Property("slug", th.StringType),
+                    )
+                ),
+            ),
+            th.Property(
+                "images",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("date_created", th.DateTimeType),
+                        th.Property("date_created_gmt", th.DateTimeType),
+                        th.Property("date_modified", th.DateTimeType),
+                        th.Property("date_modified_gmt", th.DateTimeType),
+                        th.Property("src", th.StringType),
+                        th.Property("name", th.StringType),
+                        th.Property("alt", th.StringType),
+                    )
+                ),
+            ),
+            th.Property(
+                "attributes",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("name", th.StringType),
+                        th.Property("position", th.IntegerType),
+                        th.Property("visible", th.BooleanType),
+                        th.Property("variation", th.BooleanType),
+                        th.Property("options", th.ArrayType(th.StringType)),
+                    )
+                ),
+            ),
+            th.Property(
+                "default_attributes",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("name", th.StringType),
+                        th.Property("option", th.StringType),
+                    )
+                ),
+            ),
+            th.Property("variations", th.ArrayType(th.IntegerType)),
+            th.Property("grouped_products", th.ArrayType(th.IntegerType)),
+            th.Property("menu_order", th.IntegerType),
+            METADATA_FIELD_SCHEMA,
+            th.Property("has_options", th.BooleanType),
+            # th.Property("post_password", th.StringType),  # Not sure if this is safe to extract
+            # th.Property("yoast_head", th.StringType),
+            # th.Property("yoast_head_json", th.JSONPointerType),
+            th.Property("jetpack_sharing_enabled", th.BooleanType),
+            LINKS_FIELD_SCHEMA,
+        ).to_dict()
+
+    child_context_fields = ("variations",)
+
+    def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
+        """Return a context dictionary for child streams."""
+        return {
+            "product_id": record["id"],
+        }
+
+    def generate_child_contexts(
+        self, record: dict, context: Optional[dict]
+    ) -> t.Iterable[Optional[dict]]:
+        """Generate child contexts for variable products whose variations may have changed.
+
+        Products without variations are skipped, and so are products not
+        modified since the variations were last synced: saving a variation
+        saves its product too.
+        """
+        if "variations" in record and not record["variations"]:
+            self.skip_child_requests()
+            return
+        for child_context in super().generate_child_contexts(record, context):
+            if child_context is not None and self._variations_unchanged(
+                record, child_context
+            ):
+                self.skip_child_requests()
+                continue
+            yield child_context
+
+    def _variations_unchanged(self, record: dict, child_context: dict) -> bool:
+        modified = record.get(self.replication_key)
+        if not modified:
+            return False
+        for child_stream in self.child_streams:
+            if child_stream.replication_key is None:
+                return False
+            if self.store_id is not None:
+                child_context = {**child_context, STORE_ID_PROPERTY: self.store_id}
+            synced_until = child_stream.get_starting_timestamp(child_context)
+            if synced_until is None or pendulum.parse(modified) > synced_until:
+                return False
+        return True
+
+
+class ProductVariationsStream(wooStream):
+    """Variations of variable products, synced for the products that changed."""
+
+    name = "product_variations"
+    path = "/products/{product_id}/variations"
+    primary_keys = ["id"]
+    replication_key = "date_modified_gmt"
+    parent_stream_type = ProductsStream
+    state_partitioning_keys: list[str] = []
+
+    @property
+    def pagination_mode(self) -> str:
+        """Return the pagination mode, always page offsets for variations.
+
+        Every product shares the stream's bookmark, so it must only move once
+        all of them are synced, not record by record as with a keyset cursor.
+        """
+        return "offset"
+
+    @LazySchema
+    def schema() -> dict:
+        return th.PropertiesList(
+            th.Property("id", th.IntegerType),
+            th.Property("product_id", th.IntegerType),
+            th.Property("date_created", th.DateTimeType),
+            th.Property("date_created_gmt", th.DateTimeType),
+            th.Property("date_modified", th.DateTimeType),
+            th.Property("date_modified_gmt", th.DateTimeType),
+            th.Property("description", th.StringType),
+            th.Property("permalink", th.StringType),
+            th.Property("sku", th.StringType),
+            th.Property("price", th.StringType),
+            th.Property("regular_price", th.StringType),
+            th.Property("sale_price", th.StringType),
+            th.Property("date_on_sale_from", th.DateTimeType),
+            th.Property("date_on_sale_from_gmt", th.DateTimeType),
+            th.Property("date_on_sale_to", th.DateTimeType),
+            th.Property("date_on_sale_to_gmt", th.DateTimeType),
+            th.Property("on_sale", th.BooleanType),
+            th.Property("status", th.StringType),
+            th.Property("purchasable", th.BooleanType),
+            th.Property("virtual", th.BooleanType),
+            th.Property("downloadable", th.BooleanType),
+            th.Property("download_limit", th.IntegerType),
+            th.Property("download_expiry", th.IntegerType),
+            th.Property("tax_status", th.StringType),
+            th.Property("tax_class", th.StringType),
+            th.Property("manage_stock", th.BooleanType),
+            th.Property("stock_quantity", th.NumberType),
+            th.Property("stock_status", th.StringType),
+            th.Property("backorders", th.StringType),
+            th.Property("backorders_allowed", th.BooleanType),
+            th.Property("backordered", th.BooleanType),
+            th.Property("low_stock_amount", th.StringType),
+            th.Property("weight", th.StringType),
+            th.Property(
+                "dimensions",
                 th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("name", th.StringType),
-                    th.Property("slug", th.StringType),
-                )
+                    th.Property("length", th.StringType),
+                    th.Property("width", th.StringType),
+                    th.Property("height", th.StringType),
+                ),
             ),
-        ),
-        th.Property(
-            "images",
-            th.ArrayType(
+            th.Property("shipping_class", th.StringType),
+            th.Property("shipping_class_id", th.IntegerType),
+            th.Property(
+                "image",
                 th.ObjectType(
                     th.Property("id", th.IntegerType),
                     th.Property("date_created", th.DateTimeType),
@@ -243,43 +482,27 @@ class ProductsStream(wooStream):
                     th.Property("src", th.StringType),
                     th.Property("name", th.StringType),
                     th.Property("alt", th.StringType),
-                )
-            ),
-        ),
-        th.Property(
-            "attributes",
-            th.ArrayType(
-                th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("name", th.StringType),
-                    th.Property("position", th.IntegerType),
-                    th.Property("visible", th.BooleanType),
-                    th.Property("variation", th.BooleanType),
-                    th.Property("options", th.ArrayType(th.StringType)),
-                )
+                ),
             ),
-        ),
-        th.Property(
-            "default_attributes",
-            th.ArrayType(
-                th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("name", th.StringType),
-                    th.Property("option", th.StringType),
-                )
+            th.Property(
+                "attributes",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("name", th.StringType),
+                        th.Property("option", th.StringType),
+                    )
+                ),
             ),
-        ),
-        th.Property("variations", th.ArrayType(th.IntegerType)),
-        th.Property("grouped_products", th.ArrayType(th.IntegerType)),
-        th.Property("menu_order", th.IntegerType),
-        METADATA_FIELD_SCHEMA,
-        th.Property("has_options", th.BooleanType),
-        # th.Property("post_password", th.StringType),  # Not sure if this is safe to extract
-        # th.Property("yoast_head", th.StringType),
-        # th.Property("yoast_head_json", th.JSONPointerType),
-        th.Property("jetpack_sharing_enabled", th.BooleanType),
-        LINKS_FIELD_SCHEMA,
-    ).to_dict()
+            th.Property("menu_order", th.IntegerType),
+            METADATA_FIELD_SCHEMA,
+            LINKS_FIELD_SCHEMA,
+        ).to_dict()
+
+    def post_process(self, row: dict, context: dict | None = None) -> dict | None:
+        # Add in the product id
+        row["product_id"] = (context or {}).get("product_id")
+        return super().post_process(row, context)
 
 
 class SubscriptionsStream(wooStream):
@@ -287,89 +510,78 @@ class SubscriptionsStream(wooStream):
     path = "/subscriptions"
     primary_keys = ["id"]
     replication_key = "date_modified_gmt"
-    is_sorted = False
-
-    schema = th.PropertiesList(
-        th.Property("id", th.IntegerType),
-        th.Property("parent_id", th.IntegerType),
-        th.Property("status", th.StringType),
-        th.Property("currency", th.StringType),
-        th.Property("version", th.StringType),
-        th.Property("prices_include_tax", th.BooleanType),
-        th.Property("date_created", th.DateTimeType),
-        th.Property("date_modified", th.DateTimeType),
-        th.Property("date_created_gmt", th.DateTimeType),
-        th.Property("date_modified_gmt", th.DateTimeType),
-        th.Property("discount_total", th.StringType),
-        th.Property("discount_tax", th.StringType),
-        th.Property("shipping_total", th.StringType),
-        th.Property("shipping_tax", th.StringType),
-        th.Property("cart_tax", th.StringType),
-        th.Property("total", th.StringType),
-        th.Property("total_tax", th.StringType),
-        th.Property("customer_id", th.IntegerType),
-        th.Property("order_key", th.StringType),
-        BILLING_FIELD_SCHEMA,
-        SHIPPING_FIELD_SCHEMA,
-        th.Property("payment_method", th.StringType),
-        th.Property("payment_method_title", th.StringType),
-        th.Property("customer_ip_address", th.StringType),
-        th.Property("customer_user_agent", th.StringType),
-        th.Property("created_via", th.StringType),
-        th.Property("customer_note", th.StringType),
-        th.Property("date_completed", th.DateTimeType),
-        th.Property("date_paid", th.DateTimeType),
-        th.Property("number", th.StringType),
-        METADATA_FIELD_SCHEMA,
-        LINE_ITEMS_FIELD_SCHEMA,
-        TAX_LINES_FIELD_SCHEMA,
-        SHIPPING_LINES_FIELD_SCHEMA,
-        FEE_LINES_FIELD_SCHEMA,
-        th.Property(
-            "coupon_lines",
-            th.ArrayType(
-                th.ObjectType(
-                    th.Property("id", th.IntegerType),
-                    th.Property("code", th.StringType),
-                    th.Property("discount", th.StringType),
-                    th.Property("discount_tax", th.StringType),
+    supports_time_slicing = True
+    supports_deletion_sweep = True
+
+    @LazySchema
+    def schema() -> dict:
+        return th.PropertiesList(
+            th.Property("id", th.IntegerType),
+            th.Property("parent_id", th.IntegerType),
+            th.Property("status", th.StringType),
+            th.Property("currency", th.StringType),
+            th.Property("version", th.StringType),
+            th.Property("prices_include_tax", th.BooleanType),
+            th.Property("date_created", th.DateTimeType),
+            th.Property("date_modified", th.DateTimeType),
+            th.Property("date_created_gmt", th.DateTimeType),
+            th.Property("date_modified_gmt", th.DateTimeType),
+            th.Property("discount_total", th.StringType),
+            th.Property("discount_tax", th.StringType),
+            th.Property("shipping_total", th.StringType),
+            th.Property("shipping_tax", th.StringType),
+            th.Property("cart_tax", th.StringType),
+            th.Property("total", th.StringType),
+            th.Property("total_tax", th.StringType),
+            th.Property("customer_id", th.IntegerType),
+            th.Property("order_key", th.StringType),
+            BILLING_FIELD_SCHEMA,
+            SHIPPING_FIELD_SCHEMA,
+            th.Property("payment_method", th.StringType),
+            th.Property("payment_method_title", th.StringType),
+            th.Property("customer_ip_address", th.StringType),
+            th.Property("customer_user_agent", th.StringType),
+            th.Property("created_via", th.StringType),
+            th.Property("customer_note", th.StringType),
+            th.Property("date_completed", th.DateTimeType),
+            th.Property("date_paid", th.DateTimeType),
+            th.Property("number", th.StringType),
+            METADATA_FIELD_SCHEMA,
+            LINE_ITEMS_FIELD_SCHEMA,
+            TAX_LINES_FIELD_SCHEMA,
+            SHIPPING_LINES_FIELD_SCHEMA,
+            FEE_LINES_FIELD_SCHEMA,
+            th.Property(
+                "coupon_lines",
+                th.ArrayType(
+                    th.ObjectType(
+                        th.Property("id", th.IntegerType),
+                        th.Property("code", th.StringType),
+                        th.Property("discount", th.StringType),
+                        th.Property("discount_tax", th.StringType),
+                    ),
                 ),
             ),
-        ),
-        th.Property("date_completed_gmt", th.DateTimeType),
-        th.Property("date_paid_gmt", th.DateTimeType),
-        th.Property("billing_period", th.StringType),
-        th.Property("billing_interval", th.StringType),
-        th.Property("start_date_gmt", th.DateTimeType),
-        th.Property("trial_end_date_gmt", th.DateTimeType),
-        th.Property("next_payment_date_gmt", th.DateTimeType),
-        th.Property("last_payment_date_gmt", th.DateTimeType),
-        th.Property("cancelled_date_gmt", th.DateTimeType),
-        th.Property("end_date_gmt", th.DateTimeType),
-        th.Property("resubscribed_from", th.StringType),
-        th.Property("resubscribed_subscription", th.StringType),
-        th.Property("removed_line_items", th.ArrayType(th.IntegerType)),
-        th.Property("payment_url", th.StringType),
-        th.Property("is_editable", th.BooleanType),
-        th.Property("needs_payment", th.BooleanType),
-        th.Property("needs_processing", th.BooleanType),
-        th.Property("payment_retry_date_gmt", th.DateTimeType),
-        LINKS_FIELD_SCHEMA,
-    ).to_dict()
-
-    def post_process(self, row: dict, context: dict | None = None) -> dict | None:
-        list_date_fields = [
-            'trial_end_date_gmt',
-            'next_payment_date_gmt',
-            'last_payment_date_gmt',
-            'cancelled_date_gmt',
-            'end_date_gmt',
-            'payment_retry_date_gmt'
-        ]
-        for date_time_field in list_date_fields:
-            if date_time_field in row and not row[date_time_field]:
-                del row[date_time_field]
-        return super().post_process(row, context)
+            th.Property("date_completed_gmt", th.DateTimeType),
+            th.Property("date_paid_gmt", th.DateTimeType),
+            th.Property("billing_period", th.StringType),
+            th.Property("billing_interval", th.StringType),
+            th.Property("start_date_gmt", th.DateTimeType),
+            th.Property("trial_end_date_gmt", th.DateTimeType),
+            th.Property("next_payment_date_gmt", th.DateTimeType),
+            th.Property("last_payment_date_gmt", th.DateTimeType),
+            th.Property("cancelled_date_gmt", th.DateTimeType),
+            th.Property("end_date_gmt", th.DateTimeType),
+            th.Property("resubscribed_from", th.StringType),
+            th.Property("resubscribed_subscription", th.StringType),
+            th.Property("removed_line_items", th.ArrayType(th.IntegerType)),
+            th.Property("payment_url", th.StringType),
+            th.Property("is_editable", th.BooleanType),
+            th.Property("needs_payment", th.BooleanType),
+            th.Property("needs_processing", th.BooleanType),
+            th.Property("payment_retry_date_gmt", th.DateTimeType),
+            LINKS_FIELD_SCHEMA,
+        ).to_dict()
 
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
@@ -377,6 +589,76 @@ class SubscriptionsStream(wooStream):
             "subscription_id": record["id"],
         }
 
+    @property
+    def derive_subscription_orders(self) -> bool:
+        """Return whether related orders are fetched for a page at a time.
+
+        That is when the tap picked `DerivedSubscriptionOrdersStream`, which
+        it only does if the store exposes the related order caches.
+        """
+        return any(
+            isinstance(child_stream, DerivedSubscriptionOrdersStream)
+            for child_stream in self.child_streams
+        )
+
+    @property
+    def child_context_fields(self) -> tuple[str, ...]:
+        """Return the fields related order ids are read from in derived mode."""
+        if self.derive_subscription_orders:
+            return ("parent_id", "meta_data")
+        return ()
+
+    @property
+    def required_meta_keys(self) -> tuple[str, ...]:
+        """Return the meta keys related order ids are read from in derived mode."""
+        if self.derive_subscription_orders:
+            return RELATED_ORDERS_META_KEYS
+        return ()
+
+    def get_records(self, context: Optional[dict]) -> t.Iterable[dict | tuple]:
+        """Return records, batching related order ids when deriving them.
+
+        In derived mode each record is paired with a child context. The context
+        is empty except on the record that closes a batch, which carries the
+        related order ids of up to a page of subscriptions for
+        `DerivedSubscriptionOrdersStream`. Batches are also closed at the end
+        of each checkpointed page, see `wooStream._checkpointed`.
+        """
+        if not self.derive_subscription_orders:
+            yield from super().get_records(context)
+            return
+
+        order_subscriptions: dict[int, list[int]] = {}
+        previous = None
+        for record in super().get_records(context):
+            if previous is not None:
+                if len(order_subscriptions) >= self.page_size:
+                    yield previous, {"order_subscriptions": order_subscriptions}
+                    order_subscriptions = {}
+                else:
+                    yield previous, None
+            for order_id in related_order_ids(record):
+                order_subscriptions.setdefault(order_id, []).append(record["id"])
+            previous = record
+            if self._pending_checkpoint is not None:
+                # The record ends a checkpointed page, which must be synced
+                # with its related orders before the checkpoint is written.
+                yield previous, {"order_subscriptions": order_subscriptions}
+                order_subscriptions = {}
+                previous = None
+
+        if previous is not None:
+            yield previous, {"order_subscriptions": order_subscriptions}
+
+    def generate_child_contexts(
+        self, record: dict, context: Optional[dict]
+    ) -> t.Iterable[Optional[dict]]:
+        """Generate child contexts, one per batch when deriving related orders."""
+        if not self.derive_subscription_orders:
+            yield from super().generate_child_contexts(record, context)
+        elif context and context["order_subscriptions"]:
+            yield context
+
 
 class SubscriptionOrdersStream(wooStream):
     name = "subscription_orders"
@@ -385,16 +667,80 @@ class SubscriptionOrdersStream(wooStream):
     parent_stream_type = SubscriptionsStream
     state_partitioning_keys: list[str] = []
 
-    schema = th.PropertiesList(
-        th.Property(
-            "subscription_id", th.IntegerType
-        ),
-        th.Property("order_id", th.IntegerType),
-        LINE_ITEMS_FIELD_SCHEMA,
-    ).to_dict()
+    @LazySchema
+    def schema() -> dict:
+        return th.PropertiesList(
+            th.Property("subscription_id", th.IntegerType),
+            th.Property("order_id", th.IntegerType),
+            LINE_ITEMS_FIELD_SCHEMA,
+        ).to_dict()
 
     def post_process(self, row: dict, context: dict | None = None) -> dict | None:
         # Rename the id field to order_id
         row["order_id"] = row.pop("id")
         row["subscription_id"] = (context or {}).get("subscription_id")
         return super().post_process(row, context)
+
+
+class DerivedSubscriptionOrdersStream(wooStream):
+    """Subscription orders, fetched for a page of subscriptions at a time.
+
+    Used in place of `SubscriptionOrdersStream` when `subscription_orders_mode`
+    is `derived` and the store's subscriptions carry their related order
+    caches. Related order ids are taken from each subscription's parent id and
+    those caches, then fetched in bulk with `include=`.
+    """
+
+    name = "subscription_orders"
+    path = "/orders"
+    primary_keys = ["order_id"]
+    parent_stream_type = SubscriptionsStream
+    state_partitioning_keys: list[str] = []
+    schema = SubscriptionOrdersStream.__dict__["schema"]
+
+    def is_available(self) -> bool:
+        """Return whether the store's subscriptions expose their related order caches.
+
+        The caches are internal meta that a store may keep out of the REST
+        API, which would leave only the parent orders to derive. So a page of
+        subscriptions is requested and at least one of them must carry a
+        cache, even an empty one.
+        """
+        prepared_request = self.build_prepared_request(
+            method="GET",
+            url=f"{self.url_base}{SubscriptionsStream.path}",
+            params={"_fields": "meta_data", "per_page": self.page_size},
+        )
+        try:
+            # Stores fill the caches over time, so a cached answer may be stale.
+            response = self.request_decorator(self._request)(
+                prepared_request, None, cached=False
+            )
+        except (FatalAPIError, RetriableAPIError) as ex:
+            self.logger.info("Probing the related order caches failed: %s", ex)
+            return False
+        return any(
+            meta.get("key") in RELATED_ORDERS_META_KEYS
+            for subscription in response.json()
+            for meta in subscription.get("meta_data") or []
+        )
+
+    def get_url_params(self, context, next_page_token):
+        params = super().get_url_params(context, next_page_token)
+        # Related orders are selected by id, whatever their modification date.
+        params.pop("modified_after", None)
+        params.pop("modified_before", None)
+        params["include"] = ",".join(
+            str(order_id) for order_id in sorted(context["order_subscriptions"])
+        )
+        return params
+
+    def get_records(self, context: Optional[dict]) -> t.Iterable[dict]:
+        order_subscriptions = context["order_subscriptions"]
+        for order in self.request_records(context):
+            for subscription_id in order_subscriptions.get(order["id"], []):
+                yield {
+                    "subscription_id": subscription_id,
+                    "order_id": order["id"],
+                    "line_items": order.get("line_items"),
+                }
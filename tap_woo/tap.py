@@ -2,10 +2,34 @@
 
 from __future__ import annotations
 
-from singer_sdk import Tap
+import cProfile
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, TextIO
+
+import requests
+from requests.adapters import DEFAULT_POOLSIZE
+from singer_sdk import Tap, metrics
 from singer_sdk import typing as th  # JSON schema typing helpers
+from singer_sdk._singerlib import Message, StateMessage
+
+from tap_woo.helpers.discovery import (
+    catalog_cache_path,
+    load_catalog_text,
+    save_catalog_text,
+    store_id,
+)
+from tap_woo.helpers.ratelimit import RateLimiter
+from tap_woo.helpers.session import build_session
 
-from tap_woo import streams
+if TYPE_CHECKING:
+    # Imported when first used, to keep the startup of every invocation short.
+    from tap_woo import streams
+    from tap_woo.helpers.cache import ResponseCache
+    from tap_woo.helpers.output import MessageWriter
 
 
 class Tapwoo(Tap):
@@ -43,6 +67,217 @@ class Tapwoo(Tap):
             default="https://api.mysample.com",
             description="The url for the API service",
         ),
+        th.Property(
+            "stores",
+            th.ArrayType(
+                th.ObjectType(
+                    th.Property(
+                        "store_id",
+                        th.StringType,
+                        description="Identifier added to the store's records (defaults to the host of `api_url`)",
+                    ),
+                    th.Property("api_url", th.StringType, required=True),
+                    th.Property("consumer_key", th.StringType),
+                    th.Property("consumer_secret", th.StringType, secret=True),
+                    th.Property("start_date", th.DateTimeType),
+                    th.Property("end_date", th.DateTimeType),
+                )
+            ),
+            description="Extract several stores in one run; each store's settings override the top-level ones and its records are tagged with `store_id`",
+        ),
+        th.Property(
+            "store_concurrency",
+            th.IntegerType,
+            default=1,
+            description="Number of `stores` to extract in parallel",
+        ),
+        th.Property(
+            "stream_concurrency",
+            th.IntegerType,
+            default=1,
+            description="Number of top-level streams (products, orders, subscriptions), each with its child streams, to sync in parallel",
+        ),
+        th.Property(
+            "metrics_file",
+            th.StringType,
+            description="Also append the tap's metrics to this file, as JSON lines",
+        ),
+        th.Property(
+            "profile_dir",
+            th.StringType,
+            description="Profile each top-level stream sync with cProfile and write the profiles to this directory",
+        ),
+        th.Property(
+            "deletion_sweep_dir",
+            th.StringType,
+            description="Detect deleted orders, products and subscriptions by listing their ids after each sync, keeping the ids seen in this directory and writing tombstone records with `_sdc_deleted_at` for the ones that disappeared",
+        ),
+        th.Property(
+            "deletion_sweep_concurrency",
+            th.IntegerType,
+            default=4,
+            description="Number of id pages requested in parallel by deletion sweeps",
+        ),
+        th.Property(
+            "batch_file_max_mb",
+            th.NumberType,
+            default=64,
+            description="Size in megabytes at which BATCH files are rotated, in addition to the record count of `batch_config.batch_size`",
+        ),
+        th.Property(
+            "fast_output",
+            th.BooleanType,
+            default=False,
+            description="Encode messages with orjson when installed (the `fast` extra) and write them to stdout in large buffered batches, flushed after every STATE message",
+        ),
+        th.Property(
+            "output_buffer_size",
+            th.IntegerType,
+            default=1048576,
+            description="Number of bytes of messages buffered by `fast_output` before they are written out",
+        ),
+        th.Property(
+            "checkpoint_pages",
+            th.BooleanType,
+            default=False,
+            description="Write the position of every completed page to STATE, so an interrupted sync resumes from the page it stopped at (page concurrency is not used)",
+        ),
+        th.Property(
+            "max_requests_per_second",
+            th.NumberType,
+            description="Average number of requests per second sent to the store, across all streams (unset sends as fast as possible)",
+        ),
+        th.Property(
+            "request_burst",
+            th.IntegerType,
+            default=1,
+            description="Number of requests that may be sent back to back under `max_requests_per_second`",
+        ),
+        th.Property(
+            "adaptive_page_size",
+            th.BooleanType,
+            default=False,
+            description="Adapt `per_page` to observed latency and errors, paging with `offset` so no records are skipped (disables `page_concurrency`)",
+        ),
+        th.Property(
+            "min_page_size",
+            th.IntegerType,
+            default=10,
+            description="Smallest page size used by `adaptive_page_size`",
+        ),
+        th.Property(
+            "target_page_latency",
+            th.NumberType,
+            default=5.0,
+            description="Response time in seconds that `adaptive_page_size` aims for",
+        ),
+        th.Property(
+            "catalog_cache_dir",
+            th.StringType,
+            description="Cache the discovered catalog in this directory, keyed by tap version and the settings that change it, and serve `--discover` from it",
+        ),
+        th.Property(
+            "response_cache_dir",
+            th.StringType,
+            description="Cache API responses as compressed files in this directory, keyed by endpoint and parameters",
+        ),
+        th.Property(
+            "response_cache_mode",
+            th.StringType,
+            default="read_write",
+            allowed_values=["read_write", "replay"],
+            description="`read_write` serves cached responses and caches new ones, `replay` serves pages only from the cache and fails on a miss, without contacting the store",
+        ),
+        th.Property(
+            "response_cache_max_mb",
+            th.NumberType,
+            default=1024,
+            description="Size of the response cache above which the oldest entries are evicted",
+        ),
+        th.Property(
+            "response_cache_max_age",
+            th.NumberType,
+            description="Age in hours after which cached responses are discarded (unset keeps them until evicted for size)",
+        ),
+        th.Property(
+            "stream_responses",
+            th.BooleanType,
+            default=False,
+            description="Decode records while the response body is being received instead of after the whole page has arrived",
+        ),
+        th.Property(
+            "project_fields",
+            th.BooleanType,
+            default=False,
+            description="Only request the properties selected in the catalog (plus the keys the tap needs) using the `_fields` parameter",
+        ),
+        th.Property(
+            "meta_data_filters",
+            th.ObjectType(
+                additional_properties=th.ObjectType(
+                    th.Property(
+                        "keys",
+                        th.ArrayType(th.StringType),
+                        description="Glob patterns of the meta keys to keep (all keys are kept if unset, none if empty)",
+                    ),
+                    th.Property(
+                        "max_value_bytes",
+                        th.IntegerType,
+                        description="Maximum serialized size of a meta value",
+                    ),
+                    th.Property(
+                        "oversized_values",
+                        th.StringType,
+                        allowed_values=["truncate", "drop"],
+                        description="Whether to truncate or drop string meta values above `max_value_bytes` (larger arrays and objects are always dropped)",
+                    ),
+                )
+            ),
+            description="Per-stream `meta_data` filters, keyed by stream name, applied to the record and its lines",
+        ),
+        th.Property(
+            "child_concurrency",
+            th.IntegerType,
+            default=1,
+            description="Number of child stream requests (refunds, subscription orders) to run in parallel",
+        ),
+        th.Property(
+            "bulk_refunds",
+            th.BooleanType,
+            default=False,
+            description="Page refunds from the store-wide `/refunds` listing instead of one request per order, when the store supports it",
+        ),
+        th.Property(
+            "subscription_orders_mode",
+            th.StringType,
+            default="per_subscription",
+            allowed_values=["per_subscription", "derived"],
+            description="How to extract subscription orders: `per_subscription` requests each subscription's orders, `derived` fetches the related orders of a page of subscriptions with a single `include=` request, falling back to `per_subscription` for stores whose subscriptions do not expose their related order caches",
+        ),
+        th.Property(
+            "pagination_mode",
+            th.StringType,
+            default="offset",
+            allowed_values=["offset", "keyset"],
+            description="How to page through incremental streams: `offset` follows page numbers, `keyset` moves `modified_after` forward on the last `date_modified_gmt` seen",
+        ),
+        th.Property(
+            "page_concurrency",
+            th.IntegerType,
+            default=1,
+            description="Number of pages to request in parallel once the total page count is known (1 keeps sequential pagination)",
+        ),
+        th.Property(
+            "time_slice_days",
+            th.NumberType,
+            description="Split order and subscription syncs into modification windows of this many days (unset disables slicing)",
+        ),
+        th.Property(
+            "time_slice_concurrency",
+            th.IntegerType,
+            default=1,
+            description="Number of time slices to extract in parallel",
+        ),
     ).to_dict()
 
     def discover_streams(self) -> list[streams.wooStream]:
@@ -51,15 +286,17 @@ class Tapwoo(Tap):
         Returns:
             A list of discovered streams.
         """
+        from tap_woo import streams
+
         return [
             streams.ProductsStream(tap=self),
+            streams.ProductVariationsStream(tap=self),
             streams.OrdersStream(tap=self),
-            streams.RefundsStream(tap=self),
+            self._refunds_stream(),
             streams.SubscriptionsStream(tap=self),
-            streams.SubscriptionOrdersStream(tap=self),
+            self._subscription_orders_stream(),
             # streams.CouponsStream(tap=self),
             # streams.CustomersStream(tap=self),
-            # streams.ProductVariationsStream(tap=self),
             # streams.RefundsStream(tap=self),
             # streams.ShippingZonesStream(tap=self),
             # streams.ShippingMethodsStream(tap=self),
@@ -73,6 +310,369 @@ class Tapwoo(Tap):
             # streams.AttributeSetsStream(tap=self),
         ]
 
+    @property
+    def catalog_dict(self) -> dict:
+        """Return the catalog, from the `catalog_cache_dir` when it holds one.
+
+        A cached catalog spares building the streams and their schemas, and
+        the requests some of them make to pick an endpoint.
+        """
+        path = catalog_cache_path(
+            self.config,
+            {
+                "refunds": self.refunds_stream_type.__name__,
+                "subscription_orders": self.subscription_orders_stream_type.__name__,
+            },
+        )
+        if path is None:
+            return super().catalog_dict
+        catalog_text = load_catalog_text(path)
+        if catalog_text is not None:
+            return json.loads(catalog_text)
+        catalog = super().catalog_dict
+        save_catalog_text(path, json.dumps(catalog, indent=2))
+        return catalog
+
+    @cached_property
+    def message_lock(self) -> threading.RLock:
+        """Return the lock guarding the tap state and the Singer output."""
+        return threading.RLock()
+
+    @cached_property
+    def message_writer(self) -> Optional[MessageWriter]:
+        """Return the buffered message writer, if `fast_output` is enabled."""
+        from tap_woo.helpers.output import DEFAULT_BUFFER_SIZE, MessageWriter
+
+        if not self.config.get("fast_output"):
+            return None
+        return MessageWriter(
+            self.config.get("output_buffer_size") or DEFAULT_BUFFER_SIZE
+        )
+
+    @cached_property
+    def pending_batches(self) -> set:
+        """Return the streams with records not yet in a finished batch file."""
+        return set()
+
+    def write_message(self, message: Message) -> None:
+        """Write a message to stdout, one thread at a time."""
+        with self.message_lock:
+            if self.message_writer is None:
+                super().write_message(message)
+            else:
+                self.message_writer.write(message)
+
+    def sync_all(self) -> None:
+        """Sync all streams, flushing buffered output once done."""
+        try:
+            self._sync_all()
+        finally:
+            if self.message_writer is not None:
+                with self.message_lock:
+                    self.message_writer.flush()
+
+    def _sync_all(self) -> None:
+        """Sync all streams, running top-level streams in parallel if configured.
+
+        Each top-level stream is synced together with its child streams in a
+        worker thread, so the messages of a stream keep their usual order while
+        being interleaved with those of the other streams. With `stores`, every
+        store gets its own copy of the streams and each copy is scheduled
+        separately, so a slow store only holds up its own workers.
+        """
+        stores = self.stores
+        concurrency = self.config.get("stream_concurrency") or 1
+
+        self._reset_state_progress_markers()
+        self._set_compatible_replication_methods()
+        self.write_message(StateMessage(value=self.state))
+
+        if stores:
+            parent_streams = [
+                stream for store in stores for stream in self._store_streams(store)
+            ]
+            concurrency *= self.config.get("store_concurrency") or 1
+        else:
+            parent_streams = list(self.streams.values())
+        parent_streams = [
+            stream
+            for stream in parent_streams
+            if not stream.parent_stream_type and self._is_synced(stream)
+        ]
+
+        if concurrency <= 1:
+            for stream in parent_streams:
+                self._sync_stream(stream)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [
+                    executor.submit(self._sync_stream, stream)
+                    for stream in parent_streams
+                ]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except BaseException:
+                    executor.shutdown(cancel_futures=True)
+                    raise
+
+        for stream in parent_streams:
+            for synced_stream in (stream, *stream.descendent_streams):
+                synced_stream.log_sync_costs()
+
+    def _is_synced(self, stream: streams.wooStream) -> bool:
+        if stream.selected or stream.has_selected_descendents:
+            return True
+        self.logger.info("Skipping deselected stream '%s'.", stream.name)
+        return False
+
+    def _sync_stream(self, stream: streams.wooStream) -> None:
+        """Sync a top-level stream and its children, then sweep deleted records.
+
+        With `profile_dir`, this runs under cProfile and writes one profile per
+        top-level stream. Only the calling thread is profiled, so time spent in
+        worker threads shows up as waiting.
+        """
+        profile_dir = self.config.get("profile_dir")
+        if not profile_dir:
+            self._sync_stream_records(stream)
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(self._sync_stream_records, stream)
+            finally:
+                name = stream.name
+                if stream.store_id is not None:
+                    name = f"{name}-{stream.store_id}"
+                path = Path(profile_dir) / f"{name}.prof"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(path)
+                self.logger.info("Wrote the sync profile to %s", path)
+        stream.finalize_state_progress_markers()
+
+    @staticmethod
+    def _sync_stream_records(stream: streams.wooStream) -> None:
+        stream.sync()
+        if stream.deletion_sweep and stream.selected:
+            stream.sweep_deleted_records()
+
+    @cached_property
+    def stores(self) -> list[dict]:
+        """Return the configured stores, each with a `store_id`."""
+        stores = []
+        for store in self.config.get("stores") or []:
+            stores.append({**store, "store_id": store_id(store)})
+        return stores
+
+    def _store_streams(self, store: dict) -> list[streams.wooStream]:
+        """Return a copy of the tap's streams bound to a single store."""
+        from tap_woo import streams
+
+        store_streams = {}
+        for name, template in self.streams.items():
+            if isinstance(template, streams.BulkRefundsStream):
+                # Stores may or may not expose the refunds listing.
+                stream = self._refunds_stream(store)
+            elif isinstance(template, streams.DerivedSubscriptionOrdersStream):
+                # Or the related order caches of their subscriptions.
+                stream = self._subscription_orders_stream(store)
+            else:
+                stream = type(template)(tap=self)
+                stream.bind_store(store)
+            if self.input_catalog is not None:
+                stream.apply_catalog(self.input_catalog)
+            if type(stream) is type(template):
+                stream.replication_key = template.replication_key
+                stream.forced_replication_method = template.forced_replication_method
+            store_streams[name] = stream
+        for stream in store_streams.values():
+            stream.child_streams = [
+                child_stream
+                for child_stream in store_streams.values()
+                if child_stream.parent_stream_type
+                and isinstance(stream, child_stream.parent_stream_type)
+            ]
+        return list(store_streams.values())
+
+    @cached_property
+    def _metrics_file(self) -> Optional[TextIO]:
+        path = self.config.get("metrics_file")
+        if not path:
+            return None
+        return open(path, "a", buffering=1)  # noqa: SIM115
+
+    def write_metric(self, point: metrics.Point) -> None:
+        """Append a metric point to the `metrics_file`, if one is configured."""
+        if self._metrics_file is None:
+            return
+        line = point.to_json()
+        with self.message_lock:
+            self._metrics_file.write(line + "\n")
+
+    @cached_property
+    def connection_pool_size(self) -> int:
+        """Return how many connections to keep open to a store.
+
+        This is the number of requests that can be in flight at the same time
+        for a store, given the concurrency settings.
+        """
+        per_stream = max(
+            (self.config.get("page_concurrency") or 1)
+            * (self.config.get("time_slice_concurrency") or 1),
+            self.config.get("child_concurrency") or 1,
+        )
+        if self.config.get("deletion_sweep_dir"):
+            per_stream = max(
+                per_stream, self.config.get("deletion_sweep_concurrency") or 1
+            )
+        in_flight = per_stream * (self.config.get("stream_concurrency") or 1)
+        return max(in_flight, DEFAULT_POOLSIZE)
+
+    @cached_property
+    def _store_sessions(self) -> dict[Optional[str], requests.Session]:
+        return {}
+
+    def get_session(self, store_id: Optional[str] = None) -> requests.Session:
+        """Return the HTTP session of a store, shared by all of its streams."""
+        with self.message_lock:
+            if store_id not in self._store_sessions:
+                self._store_sessions[store_id] = build_session(
+                    self.connection_pool_size,
+                    stream=bool(self.config.get("stream_responses")),
+                )
+            return self._store_sessions[store_id]
+
+    @cached_property
+    def rate_limiter(self) -> RateLimiter:
+        """Return the rate limiter shared by the streams of a single store."""
+        return self._new_rate_limiter()
+
+    @cached_property
+    def _store_rate_limiters(self) -> dict[str, RateLimiter]:
+        return {}
+
+    def get_rate_limiter(self, store_id: Optional[str] = None) -> RateLimiter:
+        """Return the rate limiter of a store, each store having its own budget."""
+        if store_id is None:
+            return self.rate_limiter
+        with self.message_lock:
+            if store_id not in self._store_rate_limiters:
+                self._store_rate_limiters[store_id] = self._new_rate_limiter()
+            return self._store_rate_limiters[store_id]
+
+    def _new_rate_limiter(self) -> RateLimiter:
+        return RateLimiter(
+            rate=self.config.get("max_requests_per_second"),
+            burst=self.config.get("request_burst") or 1,
+        )
+
+    @cached_property
+    def response_cache(self) -> Optional[ResponseCache]:
+        """Return the response cache shared by all streams, if configured."""
+        from tap_woo.helpers.cache import READ_WRITE, ResponseCache
+
+        directory = self.config.get("response_cache_dir")
+        if not directory:
+            return None
+        max_age = self.config.get("response_cache_max_age")
+        return ResponseCache(
+            directory,
+            mode=self.config.get("response_cache_mode") or READ_WRITE,
+            max_bytes=int(self.config.get("response_cache_max_mb", 1024) * 1024**2),
+            max_age=max_age * 3600 if max_age is not None else None,
+        )
+
+    def _refunds_stream(self, store: Optional[dict] = None) -> streams.wooStream:
+        """Return the refunds stream, using the bulk listing when possible.
+
+        With `stores`, the tap's own stream is only a template for the streams
+        of each store, which `_store_streams` creates by calling this with the
+        store, so that each store is probed with its own URL and credentials.
+        """
+        from tap_woo import streams
+
+        if store is None:
+            return self.refunds_stream_type(tap=self)
+        if self.config.get("bulk_refunds"):
+            bulk_stream = streams.BulkRefundsStream(tap=self)
+            bulk_stream.bind_store(store)
+            if self._has_refunds_listing(bulk_stream):
+                return bulk_stream
+        stream = streams.RefundsStream(tap=self)
+        stream.bind_store(store)
+        return stream
+
+    @cached_property
+    def refunds_stream_type(self) -> type[streams.wooStream]:
+        """Return the class of the tap's refunds stream, probing `api_url` if needed."""
+        from tap_woo import streams
+
+        if self.config.get("bulk_refunds") and (
+            self.stores
+            or self._has_refunds_listing(streams.BulkRefundsStream(tap=self))
+        ):
+            return streams.BulkRefundsStream
+        return streams.RefundsStream
+
+    def _has_refunds_listing(self, stream: streams.BulkRefundsStream) -> bool:
+        """Return whether the store of a bulk refunds stream lists its refunds."""
+        if stream.is_available():
+            return True
+        self.logger.warning(
+            "The store %s does not expose a refunds listing, "
+            "falling back to fetching refunds order by order.",
+            stream.url_base,
+        )
+        return False
+
+    def _subscription_orders_stream(
+        self, store: Optional[dict] = None
+    ) -> streams.wooStream:
+        """Return the subscription orders stream for the configured mode.
+
+        Like `_refunds_stream`, derived mode is only used for the stores whose
+        subscriptions expose their related order caches.
+        """
+        from tap_woo import streams
+
+        if store is None:
+            return self.subscription_orders_stream_type(tap=self)
+        if self.config.get("subscription_orders_mode") == "derived":
+            derived_stream = streams.DerivedSubscriptionOrdersStream(tap=self)
+            derived_stream.bind_store(store)
+            if self._has_related_order_caches(derived_stream):
+                return derived_stream
+        stream = streams.SubscriptionOrdersStream(tap=self)
+        stream.bind_store(store)
+        return stream
+
+    @cached_property
+    def subscription_orders_stream_type(self) -> type[streams.wooStream]:
+        """Return the class of the tap's subscription orders stream, probing if needed."""
+        from tap_woo import streams
+
+        if self.config.get("subscription_orders_mode") == "derived" and (
+            self.stores
+            or self._has_related_order_caches(
+                streams.DerivedSubscriptionOrdersStream(tap=self)
+            )
+        ):
+            return streams.DerivedSubscriptionOrdersStream
+        return streams.SubscriptionOrdersStream
+
+    def _has_related_order_caches(
+        self, stream: streams.DerivedSubscriptionOrdersStream
+    ) -> bool:
+        """Return whether the subscriptions of a store expose their related orders."""
+        if stream.is_available():
+            return True
+        self.logger.warning(
+            "The subscriptions of the store %s do not expose their related order "
+            "caches, falling back to fetching orders subscription by subscription.",
+            stream.url_base,
+        )
+        return False
+
 
 if __name__ == "__main__":
     Tapwoo.cli()
@@ -0,0 +1,455 @@
+"""A local stand-in for the WooCommerce REST API.
+
+Serves synthetic orders, refunds, products, product variations, subscriptions
+and subscription orders under `/wp-json/wc/v3`, with the pagination headers, filters and
+failure modes the tap relies on. Used by the end-to-end tests and the
+benchmarks, and runnable on its own:
+
+    python -m tap_woo.testing --orders 20000 --latency 0.05 --port 8080
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+API_PREFIX = "/wp-json/wc/v3"
+GMT_FORMAT = "%Y-%m-%dT%H:%M:%S"
+MAX_PER_PAGE = 100
+EPOCH = datetime(2023, 1, 1)
+
+ROUTES = [
+    (re.compile(r"^/orders/(?P<id>\d+)/refunds$"), "order_refunds"),
+    (re.compile(r"^/subscriptions/(?P<id>\d+)/orders$"), "subscription_orders"),
+    (re.compile(r"^/products/(?P<id>\d+)/variations$"), "product_variations"),
+    (re.compile(r"^/(?P<collection>orders|products|subscriptions|refunds)$"), "list"),
+]
+
+
+def _date(moment: datetime) -> str:
+    return moment.strftime(GMT_FORMAT)
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value.rstrip("Z").split("+")[0])
+
+
+class MockWooStore:
+    """Synthetic store data and the request handling logic of the API."""
+
+    def __init__(
+        self,
+        orders: int = 1000,
+        products: int = 200,
+        subscriptions: int = 200,
+        refund_rate: float = 0.1,
+        renewals_per_subscription: int = 3,
+        meta_entries: int = 5,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+        retry_after: float = 0,
+        bulk_refunds: bool = True,
+        related_order_caches: bool = True,
+        variable_rate: float = 0.2,
+        seed: int = 0,
+    ) -> None:
+        """Generate the store's data.
+
+        Args:
+            orders: Number of orders.
+            products: Number of products.
+            subscriptions: Number of subscriptions, each with a parent order and
+                some renewal orders taken from `orders`.
+            refund_rate: Fraction of orders with a refund.
+            renewals_per_subscription: Renewal orders linked to a subscription.
+            meta_entries: `meta_data` entries per record.
+            latency: Seconds added to every response.
+            throttle_every: Answer every nth request with a 429 (0 disables).
+            retry_after: `Retry-After` value sent with 429 responses.
+            bulk_refunds: Whether the `/refunds` listing is available.
+            related_order_caches: Whether subscriptions carry the meta caching
+                their renewal order ids.
+            variable_rate: Fraction of products with variations.
+            seed: Random seed, the same seed always gives the same data.
+        """
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.bulk_refunds = bulk_refunds
+        self.request_counts: Counter = Counter()
+        self._request_index = itertools.count(1)
+        self._lock = threading.Lock()
+
+        rng = random.Random(seed)
+        self.products = [
+            self._product(rng, product_id, meta_entries)
+            for product_id in range(1, products + 1)
+        ]
+        self.orders = [
+            self._order(rng, order_id, products, meta_entries)
+            for order_id in range(1, orders + 1)
+        ]
+        self.refunds = []
+        for order in self.orders:
+            if rng.random() < refund_rate:
+                refund = self._refund(order, len(self.refunds) + 1)
+                self.refunds.append(refund)
+                order["refunds"].append(
+                    {k: refund[k] for k in ("id", "reason", "total")}
+                )
+        self._renewal_ids: dict[int, list] = {}
+        self.subscriptions = [
+            self._subscription(rng, subscription_id, renewals_per_subscription)
+            for subscription_id in range(1, subscriptions + 1)
+        ]
+        if not related_order_caches:
+            for subscription in self.subscriptions:
+                subscription["meta_data"] = subscription["meta_data"][1:]
+        self.variations = []
+        self._variations_by_product: dict[int, list] = {}
+        for product in self.products:
+            if rng.random() < variable_rate:
+                variations = [
+                    self._variation(rng, product, products + len(self.variations) + i)
+                    for i in range(1, rng.randrange(2, 7))
+                ]
+                product["type"] = "variable"
+                product["variations"] = [variation["id"] for variation in variations]
+                self.variations.extend(variations)
+                self._variations_by_product[product["id"]] = variations
+        self._orders_by_id = {order["id"]: order for order in self.orders}
+        self._subscriptions_by_id = {sub["id"]: sub for sub in self.subscriptions}
+
+    @property
+    def request_count(self) -> int:
+        """Return the number of requests served so far."""
+        return sum(self.request_counts.values())
+
+    @staticmethod
+    def _dates(rng: random.Random, index: int) -> dict:
+        created = EPOCH + timedelta(hours=index, seconds=rng.randrange(3600))
+        modified = created + timedelta(seconds=rng.randrange(30 * 86400))
+        return {
+            "date_created": _date(created),
+            "date_created_gmt": _date(created),
+            "date_modified": _date(modified),
+            "date_modified_gmt": _date(modified),
+        }
+
+    @staticmethod
+    def _meta_data(rng: random.Random, count: int) -> list:
+        return [
+            {"id": i, "key": f"_meta_{i}", "value": "x" * rng.randrange(1, 64)}
+            for i in range(count)
+        ]
+
+    def _product(self, rng: random.Random, product_id: int, meta: int) -> dict:
+        return {
+            "id": product_id,
+            "name": f"Product {product_id}",
+            "slug": f"product-{product_id}",
+            "type": "simple",
+            "status": "publish",
+            "sku": f"SKU-{product_id:06d}",
+            "price": f"{rng.randrange(100, 10000) / 100:.2f}",
+            "regular_price": "",
+            "sale_price": "",
+            "date_on_sale_from": None,
+            "date_on_sale_to": None,
+            "variations": [],
+            "meta_data": self._meta_data(rng, meta),
+            **self._dates(rng, product_id),
+        }
+
+    def _variation(self, rng: random.Random, product: dict, variation_id: int):
+        # Variations are saved with their product, or on their own before it.
+        created = _parse_date(product["date_created_gmt"])
+        modified = _parse_date(product["date_modified_gmt"])
+        saved = created + (modified - created) * rng.choice((0, rng.random(), 1))
+        return {
+            "id": variation_id,
+            "sku": f"{product['sku']}-{variation_id}",
+            "price": product["price"],
+            "status": "publish",
+            "attributes": [{"id": 1, "name": "Size", "option": f"S{variation_id}"}],
+            "meta_data": self._meta_data(rng, 1),
+            "date_created": product["date_created"],
+            "date_created_gmt": product["date_created_gmt"],
+            "date_modified": _date(saved),
+            "date_modified_gmt": _date(saved),
+        }
+
+    def _order(self, rng: random.Random, order_id: int, products: int, meta: int):
+        line_items = [
+            {
+                "id": order_id * 10 + line,
+                "product_id": rng.randrange(1, products + 1) if products else 0,
+                "quantity": rng.randrange(1, 4),
+                "total": f"{rng.randrange(100, 10000) / 100:.2f}",
+                "meta_data": self._meta_data(rng, 1),
+            }
+            for line in range(rng.randrange(1, 4))
+        ]
+        return {
+            "id": order_id,
+            "parent_id": 0,
+            "number": str(order_id),
+            "status": rng.choice(["completed", "processing", "on-hold"]),
+            "currency": "USD",
+            "total": f"{sum(float(line['total']) for line in line_items):.2f}",
+            "customer_id": rng.randrange(1, 1000),
+            "billing": {"first_name": "Jane", "email": f"c{order_id}@example.com"},
+            "shipping": {"first_name": "Jane", "country": "US"},
+            "line_items": line_items,
+            "meta_data": self._meta_data(rng, meta),
+            "refunds": [],
+            **self._dates(rng, order_id),
+        }
+
+    @staticmethod
+    def _refund(order: dict, refund_id: int) -> dict:
+        return {
+            "id": refund_id,
+            "parent_id": order["id"],
+            "date_created": order["date_modified"],
+            "date_created_gmt": order["date_modified_gmt"],
+            "amount": order["total"],
+            "reason": "Synthetic refund",
+            "total": f"-{order['total']}",
+            "refunded_by": 1,
+            "line_items": [],
+        }
+
+    def _subscription(self, rng: random.Random, subscription_id: int, renewals: int):
+        order_ids = rng.sample(
+            range(1, len(self.orders) + 1), min(renewals + 1, len(self.orders))
+        )
+        parent_id, renewal_ids = (order_ids[0], order_ids[1:]) if order_ids else (0, [])
+        self._renewal_ids[subscription_id] = renewal_ids
+        return {
+            "id": subscription_id,
+            "parent_id": parent_id,
+            "status": rng.choice(["active", "on-hold", "cancelled"]),
+            "billing_period": "month",
+            "billing_interval": "1",
+            "total": f"{rng.randrange(100, 10000) / 100:.2f}",
+            "start_date_gmt": _date(EPOCH),
+            "trial_end_date_gmt": "",
+            "next_payment_date_gmt": "",
+            "cancelled_date_gmt": "",
+            "end_date_gmt": "",
+            "meta_data": [
+                {
+                    "id": 1,
+                    "key": "_subscription_renewal_order_ids_cache",
+                    "value": renewal_ids,
+                },
+                *self._meta_data(rng, 2),
+            ],
+            **self._dates(rng, subscription_id),
+        }
+
+    def handle(self, path: str, params: dict) -> tuple[int, dict, object]:
+        """Answer a GET request.
+
+        Returns:
+            The status code, extra headers and JSON body of the response.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            index = next(self._request_index)
+            self.request_counts[path] += 1
+        if self.throttle_every and index % self.throttle_every == 0:
+            headers = {"Retry-After": str(self.retry_after)}
+            return 429, headers, {"code": "too_many_requests"}
+
+        for pattern, route in ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return 404, {}, {"code": "rest_no_route"}
+
+        if route == "order_refunds":
+            order_id = int(match["id"])
+            records = [r for r in self.refunds if r["parent_id"] == order_id]
+        elif route == "product_variations":
+            if int(match["id"]) not in self._variations_by_product:
+                product_ids = {product["id"] for product in self.products}
+                if int(match["id"]) not in product_ids:
+                    return 404, {}, {"code": "woocommerce_rest_product_invalid_id"}
+            records = self._variations_by_product.get(int(match["id"]), [])
+        elif route == "subscription_orders":
+            subscription = self._subscriptions_by_id.get(int(match["id"]))
+            if subscription is None:
+                return 404, {}, {"code": "woocommerce_rest_invalid_id"}
+            records = [
+                self._orders_by_id[order_id]
+                for order_id in self._related_order_ids(subscription)
+            ]
+        else:
+            collection = match["collection"]
+            if collection == "refunds" and not self.bulk_refunds:
+                return 404, {}, {"code": "rest_no_route"}
+            records = getattr(self, collection)
+        return self._paginate(path, records, params)
+
+    def _related_order_ids(self, subscription: dict) -> list:
+        return [subscription["parent_id"], *self._renewal_ids[subscription["id"]]]
+
+    def _paginate(self, path: str, records: list, params: dict):
+        try:
+            per_page = int(params.get("per_page", 10))
+            page = int(params.get("page", 1))
+        except ValueError:
+            return 400, {}, {"code": "rest_invalid_param"}
+        if not 1 <= per_page <= MAX_PER_PAGE or page < 1:
+            return 400, {}, {"code": "rest_invalid_param"}
+
+        modified_field = "date_modified_gmt"
+        if path.endswith("refunds"):
+            # Refunds are never modified, WooCommerce filters them on creation.
+            modified_field = "date_created_gmt"
+        if "modified_after" in params:
+            after = _date(_parse_date(params["modified_after"]))
+            records = [r for r in records if r[modified_field] > after]
+        if "modified_before" in params:
+            before = _date(_parse_date(params["modified_before"]))
+            records = [r for r in records if r[modified_field] < before]
+        if "include" in params:
+            ids = {int(i) for i in params["include"].split(",") if i}
+            records = [r for r in records if r["id"] in ids]
+
+        orderby = params.get("orderby", "date")
+        sort_field = {
+            "date": "date_created_gmt",
+            "modified": modified_field,
+            "id": "id",
+        }.get(orderby, "date_created_gmt")
+        records = sorted(
+            records,
+            key=lambda r: (r[sort_field], r["id"]),
+            reverse=params.get("order", "desc") == "desc",
+        )
+
+        total = len(records)
+        total_pages = math.ceil(total / per_page)
+        offset = int(params.get("offset", (page - 1) * per_page))
+        body = records[offset : offset + per_page]
+        if "_fields" in params:
+            fields = params["_fields"].split(",")
+            body = [{k: r[k] for k in fields if k in r} for r in body]
+
+        headers = {"X-WP-Total": str(total), "X-WP-TotalPages": str(total_pages)}
+        links = []
+        if page < total_pages and "offset" not in params:
+            query = urlencode({**params, "page": page + 1})
+            links.append(f'<{API_PREFIX}{path}?{query}>; rel="next"')
+        if page > 1 and "offset" not in params:
+            query = urlencode({**params, "page": page - 1})
+            links.append(f'<{API_PREFIX}{path}?{query}>; rel="prev"')
+        if links:
+            headers["Link"] = ", ".join(links)
+        return 200, headers, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle hold the body.
+    disable_nagle_algorithm = True
+    store: MockWooStore
+
+    def do_GET(self) -> None:  # noqa: N802
+        url = urlparse(self.path)
+        if not url.path.startswith(API_PREFIX):
+            status, headers, body = 404, {}, {"code": "rest_no_route"}
+        else:
+            status, headers, body = self.store.handle(
+                url.path[len(API_PREFIX) :], dict(parse_qsl(url.query))
+            )
+        payload = json.dumps(body).encode()
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+
+class MockWooServer:
+    """Serve a `MockWooStore` over HTTP from a background thread."""
+
+    def __init__(self, store: MockWooStore, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (_Handler,), {"store": store})
+        self.store = store
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Return the store URL, to use as the tap's `api_url`."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> MockWooServer:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> MockWooServer:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--subscriptions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=0)
+    args = parser.parse_args()
+
+    store = MockWooStore(
+        orders=args.orders,
+        products=args.products,
+        subscriptions=args.subscriptions,
+        latency=args.latency,
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+    )
+    server = MockWooServer(store, port=args.port)
+    print(f"Serving a mock store at {server.url}")
+    server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
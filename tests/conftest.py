@@ -1 +1,61 @@
 """Test Configuration."""
+
+from __future__ import annotations
+
+import io
+import json
+from datetime import timedelta
+
+import pytest
+import requests
+
+from tap_woo.tap import Tapwoo
+
+OFFLINE_CONFIG = {
+    "consumer_key": "ck_test",
+    "consumer_secret": "cs_test",
+    "api_url": "https://store.example.com/",
+}
+
+
+class FakeClock:
+    """A monotonic clock that only moves when something sleeps on it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_response(
+    request: requests.PreparedRequest,
+    records: list[dict],
+    headers: dict | None = None,
+    status_code: int = 200,
+) -> requests.Response:
+    """Build a JSON response for the given request."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(records).encode()
+    response.raw = io.BytesIO(response._content)
+    response.headers.update(headers or {})
+    response.url = request.url
+    response.request = request
+    response.elapsed = timedelta(0)
+    return response
+
+
+@pytest.fixture
+def tap_factory():
+    """Return a callable building an offline tap with extra config."""
+
+    def build(state: dict | None = None, **config) -> Tapwoo:
+        return Tapwoo(
+            config={**OFFLINE_CONFIG, **config}, state=state, validate_config=False
+        )
+
+    return build
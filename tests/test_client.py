@@ -0,0 +1,343 @@
+"""Tests for the wooStream request logic."""
+
+from __future__ import annotations
+
+import json
+import threading
+
+import backoff
+import requests
+
+from tap_woo.client import request_params
+from tap_woo.helpers.ratelimit import RateLimiter
+from tests.conftest import FakeClock, make_response
+
+
+def paged_orders(total: int, per_page: int = 100):
+    """Return a fake ``send`` serving ``total`` orders ``per_page`` at a time."""
+    pages = max((total + per_page - 1) // per_page, 1)
+    calls = []
+    lock = threading.Lock()
+
+    def send(request, **kwargs):
+        page = int(request_params(request).get("page", 1))
+        with lock:
+            calls.append(page)
+        start = (page - 1) * per_page
+        records = [
+            {"id": i, "date_modified_gmt": "2024-01-01T00:00:00"}
+            for i in range(start, min(start + per_page, total))
+        ]
+        headers = {"X-WP-Total": str(total), "X-WP-TotalPages": str(pages)}
+        if page < pages:
+            headers["Link"] = (
+                f'<https://store.example.com/wp-json/wc/v3/orders?page={page + 1}>; '
+                'rel="next"'
+            )
+        return make_response(request, records, headers)
+
+    return send, calls
+
+
+def test_concurrent_pages_are_emitted_in_order(tap_factory, monkeypatch):
+    stream = tap_factory(page_concurrency=4).streams["orders"]
+    send, calls = paged_orders(total=950)
+    monkeypatch.setattr(stream.requests_session, "send", send)
+
+    ids = [record["id"] for record in stream.request_records(None)]
+
+    assert ids == list(range(950))
+    assert sorted(calls) == list(range(1, 11))
+
+
+def test_sequential_and_concurrent_paths_match(tap_factory, monkeypatch):
+    sequential = tap_factory().streams["orders"]
+    concurrent = tap_factory(page_concurrency=3).streams["orders"]
+    for stream in (sequential, concurrent):
+        send, _ = paged_orders(total=250)
+        monkeypatch.setattr(stream.requests_session, "send", send)
+
+    assert list(sequential.request_records(None)) == list(
+        concurrent.request_records(None)
+    )
+
+
+def modified_orders(dates: list[str]):
+    """Return a fake ``send`` filtering orders on the modification window."""
+
+    def send(request, **kwargs):
+        params = request_params(request)
+        after = params.get("modified_after", "").rstrip("Z")
+        before = params.get("modified_before", "9999").rstrip("Z")
+        records = [
+            {"id": i, "date_modified_gmt": date}
+            for i, date in enumerate(dates)
+            if after < date <= before
+        ]
+        return make_response(request, records, {"X-WP-TotalPages": "1"})
+
+    return send
+
+
+def test_time_slices_are_merged_in_order(tap_factory, monkeypatch):
+    stream = tap_factory(
+        start_date="2024-01-01T00:00:00Z",
+        end_date="2024-01-05T00:00:00Z",
+        time_slice_days=1,
+        time_slice_concurrency=3,
+    ).streams["orders"]
+    dates = [
+        f"2024-01-0{day}T{hour:02d}:00:00" for day in (1, 2, 3, 4) for hour in (6, 18)
+    ]
+    monkeypatch.setattr(stream.requests_session, "send", modified_orders(dates))
+    stream._write_starting_replication_value(None)
+
+    assert len(stream.get_time_slices(None)) == 4
+    ids = [record["id"] for record in stream.get_records(None)]
+
+    assert ids == list(range(8))
+    assert stream.stream_state["replication_key_value"].startswith(
+        "2024-01-05T00:00:00"
+    )
+
+
+def test_time_slicing_is_limited_to_supported_streams(tap_factory):
+    tap = tap_factory(time_slice_days=7)
+
+    assert tap.streams["orders"].time_slice is not None
+    assert tap.streams["products"].time_slice is None
+
+
+def keyset_orders(records: list[dict]):
+    """Return a fake ``send`` serving orders sorted by modification date."""
+    requests_seen = []
+
+    def send(request, **kwargs):
+        params = request_params(request)
+        requests_seen.append(params)
+        after = params.get("modified_after", "").rstrip("Z")
+        matching = sorted(
+            (record for record in records if record["date_modified_gmt"] > after),
+            key=lambda record: record["date_modified_gmt"],
+        )
+        per_page, page = int(params["per_page"]), int(params.get("page", 1))
+        return make_response(request, matching[(page - 1) * per_page : page * per_page])
+
+    return send, requests_seen
+
+
+def test_keyset_pagination_handles_ties_by_id(tap_factory, monkeypatch):
+    stream = tap_factory(pagination_mode="keyset").streams["orders"]
+    stream.page_size = 3
+    dates = ["2024-01-01T00:00:01"] * 4 + ["2024-01-01T00:00:02"] * 2
+    dates += ["2024-01-01T00:00:03"]
+    records = [{"id": i, "date_modified_gmt": date} for i, date in enumerate(dates)]
+    send, requests_seen = keyset_orders(records)
+    monkeypatch.setattr(stream.requests_session, "send", send)
+
+    ids = [record["id"] for record in stream.request_records(None)]
+
+    assert sorted(ids) == list(range(7))
+    assert len(ids) == len(set(ids))
+    assert stream.is_sorted
+    assert requests_seen[0]["orderby"] == "modified"
+    assert requests_seen[-1]["modified_after"] == "2024-01-01T00:00:02Z"
+
+
+def test_child_contexts_are_fetched_concurrently_and_synced_in_order(
+    tap_factory, monkeypatch
+):
+    orders = [
+        {"id": i, "date_modified_gmt": "2024-01-01T00:00:00", "refunds": [{"id": i}]}
+        for i in range(1, 8)
+    ]
+    threads = set()
+
+    def send(session, request, **kwargs):
+        if request.path_url.startswith("/wp-json/wc/v3/orders?"):
+            return make_response(request, orders)
+        threads.add(threading.current_thread().name)
+        order_id = int(request.path_url.split("/")[5])
+        return make_response(request, [{"id": order_id * 10}])
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tap = tap_factory(child_concurrency=3)
+    refunds = []
+    monkeypatch.setattr(tap.streams["refunds"], "_write_record_message", refunds.append)
+    monkeypatch.setattr(tap, "write_message", lambda message: None)
+
+    tap.streams["orders"].sync()
+
+    assert [refund["original_order_id"] for refund in refunds] == list(range(1, 8))
+    assert threading.main_thread().name not in threads
+
+
+def test_requested_fields_follow_the_catalog(tap_factory):
+    tap = tap_factory(project_fields=True)
+    orders = tap.streams["orders"]
+    orders.mask.update(
+        {
+            ("properties", name): name in {"id", "total"}
+            for name in orders.schema["properties"]
+        }
+    )
+
+    assert orders.requested_fields == ["date_modified_gmt", "id", "refunds", "total"]
+    assert tap_factory().streams["orders"].requested_fields is None
+
+
+def test_streamed_responses_match_buffered_ones(tap_factory, monkeypatch):
+    buffered = tap_factory().streams["orders"]
+    streamed = tap_factory(stream_responses=True).streams["orders"]
+    for stream in (buffered, streamed):
+        send, _ = paged_orders(total=250)
+        monkeypatch.setattr(stream.requests_session, "send", send)
+
+    assert streamed.requests_session.stream
+    assert list(streamed.request_records(None)) == list(buffered.request_records(None))
+
+
+def test_adaptive_page_size_pages_by_offset(tap_factory, monkeypatch):
+    stream = tap_factory(adaptive_page_size=True).streams["orders"]
+    sizes = []
+    failed = []
+
+    def send(request, **kwargs):
+        params = request_params(request)
+        offset, per_page = int(params.get("offset", 0)), int(params["per_page"])
+        if not failed:
+            # Fail the first attempt so the retry goes out with a smaller page.
+            failed.append(per_page)
+            return make_response(request, [], status_code=503)
+        sizes.append(per_page)
+        records = [{"id": i} for i in range(offset, min(offset + per_page, 330))]
+        return make_response(request, records, {"X-WP-Total": "330"})
+
+    monkeypatch.setattr(stream.requests_session, "send", send)
+    monkeypatch.setattr(
+        stream, "backoff_wait_generator", lambda: backoff.constant(interval=0)
+    )
+
+    ids = [record["id"] for record in stream.request_records(None)]
+
+    assert ids == list(range(330))
+    assert failed == [100]
+    assert sizes[0] == 50
+    assert sizes[1] > sizes[0]
+
+
+def test_offset_pagination_stops_on_a_short_page_without_a_total(
+    tap_factory, monkeypatch
+):
+    stream = tap_factory(adaptive_page_size=True).streams["orders"]
+
+    def send(request, **kwargs):
+        params = request_params(request)
+        offset, per_page = int(params.get("offset", 0)), int(params["per_page"])
+        assert offset <= 250, "Empty pages were requested past the end."
+        records = [{"id": i} for i in range(offset, min(offset + per_page, 250))]
+        return make_response(request, records)
+
+    monkeypatch.setattr(stream.requests_session, "send", send)
+
+    assert [record["id"] for record in stream.request_records(None)] == list(range(250))
+
+
+def test_throttled_requests_wait_for_retry_after(tap_factory, monkeypatch):
+    tap = tap_factory()
+    clock = FakeClock()
+    tap.rate_limiter = RateLimiter(rate=5, clock=clock, sleep=clock.sleep)
+    stream = tap.streams["products"]
+    responses = []
+
+    def send(request, **kwargs):
+        if not responses:
+            responses.append(429)
+            return make_response(request, [], {"Retry-After": "7"}, status_code=429)
+        return make_response(request, [{"id": 1}])
+
+    monkeypatch.setattr(stream.requests_session, "send", send)
+    monkeypatch.setattr(
+        stream, "backoff_wait_generator", lambda: backoff.constant(interval=0)
+    )
+
+    assert [record["id"] for record in stream.request_records(None)] == [1]
+    assert tap.streams["orders"].rate_limiter is stream.rate_limiter
+    assert clock.now == 7
+    assert stream.rate_limiter.current_rate == 2.75
+
+
+def test_streams_of_a_store_share_a_tuned_session(tap_factory):
+    tap = tap_factory(page_concurrency=4, stream_concurrency=3)
+    orders, products = tap.streams["orders"], tap.streams["products"]
+
+    session = orders.requests_session
+    assert products.requests_session is session
+    assert session.get_adapter("https://store.example.com")._pool_maxsize == 12
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+    request = orders.prepare_request(None, None)
+    assert request.headers["Authorization"].startswith("Basic ")
+
+
+def test_hot_path_metrics_and_profiles_are_written(tap_factory, monkeypatch, tmp_path):
+    tap = tap_factory(
+        metrics_file=str(tmp_path / "metrics.jsonl"), profile_dir=str(tmp_path)
+    )
+    stream = tap.streams["products"]
+    send, _ = paged_orders(total=250)
+    monkeypatch.setattr(stream.requests_session, "send", send)
+    # The fake products have no variations to fetch.
+    monkeypatch.setattr(stream, "child_streams", [])
+
+    tap._sync_stream(stream)
+    stream.log_sync_costs()
+
+    points = {
+        point["metric"]: point
+        for point in map(json.loads, (tmp_path / "metrics.jsonl").open())
+        if point["tags"].get("stream") == "products"
+    }
+    latency = points["http_request_latency"]
+    assert latency["type"] == "histogram"
+    assert latency["value"]["count"] == 3
+    assert latency["value"]["buckets"]["+Inf"] == 3
+    assert points["records_per_page"]["value"]["sum"] == 250
+    assert points["http_response_bytes"]["value"] > 0
+    assert points["parse_duration"]["type"] == "timer"
+    assert "post_process_duration" in points
+    assert "conform_duration" in points
+    assert (tmp_path / "products.prof").stat().st_size > 0
+
+
+def test_records_are_conformed_and_cleaned_in_one_pass(tap_factory, caplog):
+    stream = tap_factory().streams["subscriptions"]
+    stream.mask[("properties", "customer_note")] = False
+    stream.logger.addHandler(caplog.handler)
+    record = {
+        "id": "7",
+        "next_payment_date_gmt": "",
+        "end_date_gmt": None,
+        "customer_note": "deselected",
+        "unknown": 1,
+        "billing": {"first_name": "Ann", "unknown": 2},
+        "line_items": [{"id": 1, "meta_data": [{"id": 2, "key": "k", "value": ""}]}],
+    }
+
+    try:
+        (message,) = stream._generate_record_messages(dict(record))
+        stream._generate_record_messages(dict(record))
+    finally:
+        stream.logger.removeHandler(caplog.handler)
+
+    assert message.record == {
+        "id": "7",
+        "end_date_gmt": None,
+        "billing": {"first_name": "Ann"},
+        "line_items": [{"id": 1, "meta_data": [{"id": 2, "key": "k", "value": ""}]}],
+    }
+    warnings = [r.getMessage() for r in caplog.records if r.levelname == "WARNING"]
+    assert len(warnings) == 3
+    assert any(
+        "'id'" in warning and "expected integer" in warning for warning in warnings
+    )
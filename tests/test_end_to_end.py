@@ -0,0 +1,270 @@
+"""End-to-end syncs against the local mock store."""
+
+from __future__ import annotations
+
+import gzip
+import json
+from collections import Counter
+from urllib.parse import urlparse
+
+import pytest
+
+from tap_woo.tap import Tapwoo
+from tap_woo.testing import MockWooServer, MockWooStore
+from tests.conftest import OFFLINE_CONFIG
+
+MODES = {
+    "sequential": {},
+    "page_concurrency": {"page_concurrency": 4},
+    "time_slices": {"time_slice_days": 60, "time_slice_concurrency": 3},
+    "keyset": {"pagination_mode": "keyset"},
+    "adaptive_page_size": {"adaptive_page_size": True},
+    "child_concurrency": {"child_concurrency": 4},
+    "derived_subscription_orders": {"subscription_orders_mode": "derived"},
+    "bulk_refunds": {"bulk_refunds": True},
+    "streamed_responses": {"stream_responses": True, "project_fields": True},
+    "stream_concurrency": {"stream_concurrency": 3},
+    "fast_output": {"fast_output": True, "output_buffer_size": 4096},
+}
+
+
+@pytest.fixture(scope="module")
+def mock_store():
+    store = MockWooStore(orders=450, products=120, subscriptions=60)
+    with MockWooServer(store) as server:
+        yield store, server.url
+
+
+def sync(url: str, capsys, **config) -> dict[str, set]:
+    tap = Tapwoo(
+        config={
+            **OFFLINE_CONFIG,
+            "api_url": url,
+            "start_date": "2022-12-01T00:00:00Z",
+            **config,
+        },
+        validate_config=False,
+    )
+    tap.sync_all()
+    records: dict[str, set] = {}
+    for stream, stream_records in sync_records(capsys).items():
+        records[stream] = {
+            tuple(record.get(name) for name in ("id", "order_id", "subscription_id"))
+            for record in stream_records
+        }
+    return records
+
+
+def sync_records(capsys) -> dict[str, list]:
+    """Return the records written to stdout so far, by stream."""
+    records: dict[str, list] = {}
+    for line in capsys.readouterr().out.splitlines():
+        message = json.loads(line)
+        if message["type"] == "RECORD":
+            records.setdefault(message["stream"], []).append(message["record"])
+    return records
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_extraction_modes_return_the_whole_store(mock_store, capsys, mode):
+    store, url = mock_store
+
+    records = sync(url, capsys, **MODES[mode])
+
+    counts = Counter({stream: len(keys) for stream, keys in records.items()})
+    assert counts == {
+        "products": len(store.products),
+        "product_variations": len(store.variations),
+        "orders": len(store.orders),
+        "refunds": len(store.refunds),
+        "subscriptions": len(store.subscriptions),
+        "subscription_orders": len(
+            {
+                (subscription["id"], order_id)
+                for subscription in store.subscriptions
+                for order_id in store._related_order_ids(subscription)
+            }
+        ),
+    }
+
+
+def test_derived_mode_falls_back_without_related_order_caches(capsys):
+    store = MockWooStore(
+        orders=60, products=5, subscriptions=20, related_order_caches=False
+    )
+    with MockWooServer(store) as server:
+        records = sync(server.url, capsys, subscription_orders_mode="derived")
+
+    assert len(records["subscription_orders"]) == sum(
+        len(store._related_order_ids(subscription))
+        for subscription in store.subscriptions
+    )
+
+
+def test_replay_serves_a_sync_from_the_response_cache(mock_store, capsys, tmp_path):
+    store, url = mock_store
+    cache = {"response_cache_dir": str(tmp_path), "child_concurrency": 4}
+
+    recorded = sync(url, capsys, **cache)
+    served = store.request_count
+    replayed = sync(url, capsys, response_cache_mode="replay", **cache)
+
+    assert store.request_count == served
+    assert replayed == recorded
+
+
+@pytest.mark.parametrize("child_concurrency", [1, 4])
+def test_batch_mode_writes_rotated_gzip_files(
+    mock_store, capsys, tmp_path, child_concurrency
+):
+    store, url = mock_store
+    batch_config = {
+        "encoding": {"format": "jsonl", "compression": "gzip"},
+        "storage": {"root": tmp_path.as_uri()},
+        "batch_size": 100,
+    }
+    tap = Tapwoo(
+        config={
+            **OFFLINE_CONFIG,
+            "api_url": url,
+            "start_date": "2022-12-01T00:00:00Z",
+            "batch_config": batch_config,
+            "batch_file_max_mb": 0.02,
+            "child_concurrency": child_concurrency,
+        },
+        validate_config=False,
+    )
+    tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {message["type"] for message in messages} == {"SCHEMA", "STATE", "BATCH"}
+    records = Counter()
+    manifests = Counter()
+    for message in messages:
+        if message["type"] == "BATCH":
+            manifests[message["stream"]] += 1
+            for file_url in message["manifest"]:
+                with gzip.open(urlparse(file_url).path) as batch_file:
+                    records[message["stream"]] += sum(1 for _ in batch_file)
+    assert records["orders"] == len(store.orders)
+    assert records["refunds"] == len(store.refunds)
+    assert records["subscriptions"] == len(store.subscriptions)
+    assert records["subscription_orders"] == sum(
+        len(store._related_order_ids(subscription))
+        for subscription in store.subscriptions
+    )
+    assert records["product_variations"] == len(store.variations)
+    assert manifests["orders"] > len(store.orders) // 100
+    states = [message for message in messages if message["type"] == "STATE"]
+    assert len(states) > manifests["orders"] // 2
+    assert messages[-1]["type"] == "STATE"
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [
+        {},
+        {"checkpoint_pages": True},
+        {"time_slice_days": 30},
+        {"pagination_mode": "keyset"},
+    ],
+)
+def test_state_never_gets_ahead_of_queued_children(mock_store, capsys, mode):
+    store, url = mock_store
+    refund_ids = {}
+    for refund in store.refunds:
+        refund_ids.setdefault(refund["parent_id"], set()).add(refund["id"])
+
+    Tapwoo(
+        config={
+            **OFFLINE_CONFIG,
+            "api_url": url,
+            "start_date": "2022-12-01T00:00:00Z",
+            "child_concurrency": 4,
+            **mode,
+        },
+        validate_config=False,
+    ).sync_all()
+
+    order_ids, synced_refund_ids, states = [], set(), 0
+    for line in capsys.readouterr().out.splitlines():
+        message = json.loads(line)
+        if message["type"] == "RECORD" and message["stream"] == "orders":
+            order_ids.append(message["record"]["id"])
+        elif message["type"] == "RECORD" and message["stream"] == "refunds":
+            synced_refund_ids.add(message["record"]["id"])
+        elif message["type"] == "STATE" and order_ids:
+            states += 1
+            for order_id in order_ids:
+                assert refund_ids.get(order_id, set()) <= synced_refund_ids
+    assert states > 1
+
+
+@pytest.mark.parametrize("response_cache", [False, True])
+def test_deletion_sweep_writes_tombstones(capsys, tmp_path, response_cache):
+    store = MockWooStore(orders=250, products=30, subscriptions=10)
+    config = {
+        "deletion_sweep_dir": str(tmp_path),
+        "deletion_sweep_concurrency": 3,
+        "start_date": "2022-12-01T00:00:00Z",
+    }
+    if response_cache:
+        # The sweep must see deletions past the cached id pages.
+        config["response_cache_dir"] = str(tmp_path / "cache")
+    with MockWooServer(store) as server:
+        tap = Tapwoo(
+            config={**OFFLINE_CONFIG, "api_url": server.url, **config},
+            validate_config=False,
+        )
+        tap.sync_all()
+        capsys.readouterr()
+        deleted_ids = [order["id"] for order in store.orders[::50]]
+        store.orders = [o for o in store.orders if o["id"] not in deleted_ids]
+        Tapwoo(
+            config={**OFFLINE_CONFIG, "api_url": server.url, **config},
+            state=tap.state,
+            validate_config=False,
+        ).sync_all()
+
+    tombstones = {}
+    for line in capsys.readouterr().out.splitlines():
+        message = json.loads(line)
+        if message["type"] == "RECORD" and "_sdc_deleted_at" in message["record"]:
+            tombstones.setdefault(message["stream"], []).append(message["record"])
+    assert list(tombstones) == ["orders"]
+    assert sorted(record["id"] for record in tombstones["orders"]) == sorted(
+        deleted_ids
+    )
+    assert set(tombstones["orders"][0]) == {"id", "_sdc_deleted_at"}
+    assert (tmp_path / "orders.ids").stat().st_size < 1000
+
+
+def test_variations_are_only_fetched_for_changed_products(capsys):
+    store = MockWooStore(orders=20, products=60, subscriptions=5)
+    config = {**OFFLINE_CONFIG, "start_date": "2022-12-01T00:00:00Z"}
+    with MockWooServer(store) as server:
+        config["api_url"] = server.url
+        tap = Tapwoo(config={**config, "child_concurrency": 4}, validate_config=False)
+        tap.sync_all()
+        first = sync_records(capsys)
+        variable = [product for product in store.products if product["variations"]]
+        assert len(first["product_variations"]) == len(store.variations)
+        assert sum(
+            count
+            for path, count in store.request_counts.items()
+            if "variations" in path
+        ) == len(variable)
+
+        changed = variable[0]
+        for record in (changed, *store._variations_by_product[changed["id"]]):
+            record["date_modified_gmt"] = "2030-01-01T00:00:00"
+        store.request_counts.clear()
+        Tapwoo(config=config, state=tap.state, validate_config=False).sync_all()
+        second = sync_records(capsys)
+
+    assert [path for path in store.request_counts if "variations" in path] == [
+        f"/products/{changed['id']}/variations"
+    ]
+    assert {record["id"] for record in second["product_variations"]} == set(
+        changed["variations"]
+    )
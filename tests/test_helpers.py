@@ -0,0 +1,240 @@
+"""Tests for the tap's helper modules."""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import random
+from urllib.parse import urlparse
+
+import pytest
+import requests
+from singer_sdk import typing as th
+from singer_sdk._singerlib import RecordMessage, StateMessage
+from singer_sdk._singerlib.messages import format_message
+from singer_sdk.exceptions import FatalAPIError
+from singer_sdk.helpers._batch import BatchConfig
+
+from tap_woo.helpers.batch import BatchFileWriter
+from tap_woo.helpers.cache import ResponseCache, cache_key
+from tap_woo.helpers.common_fields import METADATA_FIELD_SCHEMA
+from tap_woo.helpers.idset import load_ids, missing_ids, save_ids
+from tap_woo.helpers.jsonstream import iter_json_array
+from tap_woo.helpers.metadata import MetaDataFilter
+from tap_woo.helpers.output import MessageWriter
+from tap_woo.helpers.pagesize import PageSizeController
+from tap_woo.helpers.ratelimit import RateLimiter
+from tests.conftest import FakeClock, make_response
+
+
+def test_meta_data_filter_applies_to_record_and_lines():
+    meta_filter = MetaDataFilter(keys=["_wc_*", "gift"], max_value_bytes=5)
+    record = {
+        "meta_data": [
+            {"id": 1, "key": "_wc_order_source", "value": "checkout"},
+            {"id": 2, "key": "_plugin_blob", "value": {"a": 1}},
+        ],
+        "line_items": [
+            {"id": 3, "meta_data": [{"id": 4, "key": "gift", "value": "yes"}]},
+            {"id": 5, "meta_data": [{"id": 6, "key": "size", "value": "L"}]},
+        ],
+    }
+
+    meta_filter(record)
+
+    assert record["meta_data"] == [
+        {"id": 1, "key": "_wc_order_source", "value": "check"}
+    ]
+    assert record["line_items"][0]["meta_data"] == [
+        {"id": 4, "key": "gift", "value": "yes"}
+    ]
+    assert record["line_items"][1]["meta_data"] == []
+
+
+def test_meta_data_filter_drops_oversized_values():
+    meta_filter = MetaDataFilter(max_value_bytes=8, oversized_values="drop")
+
+    entries = meta_filter.filter_entries(
+        [{"key": "small", "value": [1, 2]}, {"key": "big", "value": "x" * 100}]
+    )
+
+    assert entries == [{"key": "small", "value": [1, 2]}]
+
+
+def test_meta_data_filter_only_truncates_strings():
+    meta_filter = MetaDataFilter(max_value_bytes=5)
+
+    entries = meta_filter.filter_entries(
+        [{"key": "note", "value": "vvvvvvvv"}, {"key": "blob", "value": {"k": "v" * 8}}]
+    )
+
+    assert entries == [{"key": "note", "value": "vvvvv"}]
+
+
+def test_meta_data_filter_with_no_keys_keeps_nothing():
+    entries = [{"key": "gift", "value": "yes"}]
+
+    assert MetaDataFilter.from_config({"keys": []}).filter_entries(entries) == []
+    assert MetaDataFilter.from_config(
+        {"keys": []}, always_keep=["gift"]
+    ).filter_entries(entries) == [{"key": "gift", "value": "yes"}]
+
+
+def test_meta_data_filter_keeps_required_values_whole():
+    meta_filter = MetaDataFilter.from_config(
+        {"max_value_bytes": 5}, always_keep=["_subscription_renewal_order_ids_cache"]
+    )
+    entry = {"key": "_subscription_renewal_order_ids_cache", "value": [101, 102]}
+
+    assert meta_filter.filter_entries([dict(entry)]) == [entry]
+
+
+def test_iter_json_array_yields_elements_across_chunks():
+    body = json.dumps([{"id": 1, "name": "é" * 3}, {"id": 22}, [3], 456]).encode()
+    chunks = [body[i : i + 3] for i in range(0, len(body), 3)]
+
+    assert list(iter_json_array(chunks)) == json.loads(body)
+    assert list(iter_json_array([b" [ ] "])) == []
+
+
+def test_iter_json_array_rejects_truncated_bodies():
+    with pytest.raises(ValueError, match="Truncated"):
+        list(iter_json_array([b'[{"id": 1}, {"id"']))
+
+
+def test_page_size_controller_stays_within_bounds():
+    controller = PageSizeController(
+        initial=100, minimum=10, maximum=100, target_latency=2.0
+    )
+
+    assert controller.record_failure()
+    assert controller.size == 50
+    assert controller.record_success(3.0)
+    assert controller.size == 37
+    assert not controller.record_success(1.5)
+    for _ in range(10):
+        controller.record_success(0.1)
+    assert controller.size == 100
+    for _ in range(10):
+        controller.record_failure()
+    assert controller.size == 10
+
+
+def test_rate_limiter_spaces_requests_after_the_burst():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+    assert [limiter.acquire() for _ in range(5)] == [0, 0, 0, 0.5, 0.5]
+    assert clock.now == 1.0
+
+
+def test_rate_limiter_honors_retry_after_and_recovers():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+
+    limiter.throttle(retry_after=30)
+    assert limiter.acquire() == 30
+    assert limiter.current_rate == 5
+    for _ in range(20):
+        limiter.recover()
+    assert limiter.current_rate == 10
+
+
+def test_response_cache_evicts_old_and_expired_entries(tmp_path):
+    def page(number):
+        return requests.Request(
+            "GET", f"https://store.example.com/orders?page={number}&per_page=5"
+        ).prepare()
+
+    def body(number):
+        return [{"id": number, "note": random.Random(number).randbytes(4000).hex()}]
+
+    cache = ResponseCache(tmp_path, max_bytes=12_000)
+    for number in range(1, 4):
+        cache.put(page(number), make_response(page(number), body(number)))
+
+    assert cache.get(page(1)) is None
+    assert cache.get(page(2)).json() == body(2)
+    reordered = requests.Request(
+        "GET", "https://store.example.com/orders?per_page=5&page=3"
+    ).prepare()
+    assert cache.get(reordered).json() == body(3)
+
+    os.utime(tmp_path / cache_key(page(3))[:2] / f"{cache_key(page(3))}.gz", (0, 0))
+    replay = ResponseCache(tmp_path, mode="replay", max_age=3600)
+    assert replay.get(page(2)).json() == body(2)
+    with pytest.raises(FatalAPIError):
+        replay.get(page(3))
+
+
+def test_message_writer_matches_sdk_output_and_flushes_on_state(capsys):
+    writer = MessageWriter(buffer_size=1024 * 1024)
+    record = RecordMessage(
+        stream="orders",
+        record={"id": 1, "total": "9.99", "paid": True, "lines": [{"id": 2}]},
+        time_extracted=datetime.datetime(
+            2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+        ),
+    )
+    state = StateMessage(value={"bookmarks": {"orders": {}}})
+
+    writer.write(record)
+    assert capsys.readouterr().out == ""
+    writer.write(state)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        json.loads(format_message(record)),
+        json.loads(format_message(state)),
+    ]
+
+
+def test_id_sets_round_trip_and_diff(tmp_path):
+    path = tmp_path / "orders.ids"
+    assert load_ids(path) is None
+
+    save_ids(path, [7, 3, 2**40, 3, 12])
+
+    assert list(load_ids(path)) == [3, 7, 12, 2**40]
+    assert missing_ids(load_ids(path), [1, 7, 12, 13]) == [3, 2**40]
+
+
+def test_parquet_batches_share_the_schema_of_the_stream(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    batch_config = BatchConfig.from_dict(
+        {
+            "encoding": {"format": "parquet", "compression": "gzip"},
+            "storage": {"root": tmp_path.as_uri()},
+            "batch_size": 2,
+        }
+    )
+    schema = th.PropertiesList(
+        th.Property("id", th.IntegerType),
+        th.Property("total", th.NumberType),
+        th.Property("date_modified_gmt", th.DateTimeType),
+        METADATA_FIELD_SCHEMA,
+    ).to_dict()
+    writer = BatchFileWriter(batch_config, "orders", schema=schema, max_bytes=2**20)
+    values = ["text", ["a", "b"], {"nested": 1}, None]
+    urls = [
+        writer.add(
+            {
+                "id": i,
+                "total": i * 1.5,
+                "date_modified_gmt": "2024-01-01T00:00:00Z",
+                "meta_data": [{"id": i, "key": "_meta", "value": value}],
+            }
+        )
+        for i, value in enumerate(values)
+    ]
+    assert writer.close() is None
+
+    tables = [pq.read_table(urlparse(url).path) for url in urls if url is not None]
+    assert len(tables) == 2
+    assert tables[0].schema == tables[1].schema
+    rows = [row for table in tables for row in table.to_pylist()]
+    assert [json.loads(row["meta_data"][0]["value"] or "null") for row in rows] == (
+        values
+    )
+    assert rows[1]["total"] == 1.5
@@ -0,0 +1,126 @@
+"""Tests for stream-specific behaviour."""
+
+from __future__ import annotations
+
+import backoff
+import requests
+
+from tap_woo.client import request_params
+from tap_woo.streams import (
+    BulkRefundsStream,
+    DerivedSubscriptionOrdersStream,
+    OrdersStream,
+    RefundsStream,
+)
+from tests.conftest import make_response
+
+
+def test_orders_without_refunds_skip_the_refunds_request(tap_factory):
+    orders = tap_factory().streams["orders"]
+    refunds = orders.child_streams[0]
+
+    with_refunds = {"id": 1, "refunds": [{"id": 7, "reason": "", "total": "-1.00"}]}
+    without_refunds = {"id": 2, "refunds": []}
+
+    assert list(orders.generate_child_contexts(with_refunds, None)) == [{"order_id": 1}]
+    assert list(orders.generate_child_contexts(without_refunds, None)) == []
+    assert refunds.skipped_request_count == 1
+
+    # Skipped requests are only counted while the refunds are selected.
+    refunds.selected = False
+    assert list(orders.generate_child_contexts(without_refunds, None)) == []
+    assert refunds.skipped_request_count == 1
+
+
+def test_bulk_refunds_fall_back_when_the_endpoint_is_missing(tap_factory, monkeypatch):
+    monkeypatch.setattr(
+        requests.Session,
+        "send",
+        lambda session, request, **kwargs: make_response(request, [], status_code=404),
+    )
+    tap = tap_factory(bulk_refunds=True)
+
+    assert isinstance(tap.streams["refunds"], RefundsStream)
+    assert tap.streams["refunds"].parent_stream_type is OrdersStream
+
+
+def test_bulk_refunds_probe_retries_and_caches_no_failure(
+    tap_factory, monkeypatch, tmp_path
+):
+    statuses = [503] * 10
+    monkeypatch.setattr(
+        requests.Session,
+        "send",
+        lambda session, request, **kwargs: make_response(
+            request, [], status_code=statuses.pop(0) if statuses else 200
+        ),
+    )
+    monkeypatch.setattr(
+        BulkRefundsStream, "backoff_wait_generator", lambda self: backoff.constant(0)
+    )
+    config = {"bulk_refunds": True, "response_cache_dir": str(tmp_path)}
+
+    assert isinstance(tap_factory(**config).streams["refunds"], RefundsStream)
+    assert len(statuses) < 10
+    statuses.clear()
+    assert isinstance(tap_factory(**config).streams["refunds"], BulkRefundsStream)
+
+
+def test_bulk_refunds_use_the_listing_when_available(tap_factory, monkeypatch):
+    monkeypatch.setattr(
+        requests.Session,
+        "send",
+        lambda session, request, **kwargs: make_response(request, []),
+    )
+    refunds = tap_factory(bulk_refunds=True).streams["refunds"]
+
+    assert isinstance(refunds, BulkRefundsStream)
+    assert refunds.post_process({"id": 3, "parent_id": 42}) == {
+        "id": 3,
+        "original_order_id": 42,
+    }
+
+
+def test_derived_subscription_orders_batch_related_orders(tap_factory, monkeypatch):
+    subscriptions = [
+        {
+            "id": 100 + i,
+            "parent_id": i,
+            "date_modified_gmt": "2024-01-01T00:00:00",
+            "meta_data": [
+                {"key": "_subscription_renewal_order_ids_cache", "value": [50 + i]}
+            ],
+        }
+        for i in range(1, 4)
+    ]
+    requested = []
+
+    def send(session, request, **kwargs):
+        params = request_params(request)
+        if request.path_url.startswith("/wp-json/wc/v3/subscriptions"):
+            return make_response(request, subscriptions)
+        requested.append(params["include"])
+        include = [int(order_id) for order_id in params["include"].split(",")]
+        orders = [{"id": order_id, "line_items": []} for order_id in include]
+        return make_response(request, orders)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tap = tap_factory(subscription_orders_mode="derived")
+    tap.streams["subscriptions"].page_size = 4
+    child = tap.streams["subscription_orders"]
+    records = []
+    monkeypatch.setattr(child, "_write_record_message", records.append)
+    monkeypatch.setattr(tap, "write_message", lambda message: None)
+
+    tap.streams["subscriptions"].sync()
+
+    assert isinstance(child, DerivedSubscriptionOrdersStream)
+    assert requested == ["1,2,51,52", "3,53"]
+    assert {(r["subscription_id"], r["order_id"]) for r in records} == {
+        (101, 1),
+        (101, 51),
+        (102, 2),
+        (102, 52),
+        (103, 3),
+        (103, 53),
+    }
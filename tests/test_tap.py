@@ -0,0 +1,301 @@
+"""Tests for tap-level behaviour."""
+
+from __future__ import annotations
+
+import copy
+import json
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+from tap_woo.client import request_params
+from tap_woo.tap import Tapwoo
+from tests.conftest import OFFLINE_CONFIG, make_response
+
+
+def test_top_level_streams_sync_concurrently(tap_factory, monkeypatch, capsys):
+    # Both streams must be waiting on their first page at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def send(session, request, **kwargs):
+        path = urlparse(request.url).path.rsplit("/", 1)[-1]
+        records = []
+        if path in ("products", "orders"):
+            barrier.wait()
+            records = [
+                {
+                    "id": i,
+                    "refunds": [],
+                    "date_modified_gmt": f"2024-01-0{i}T00:00:00",
+                }
+                for i in (1, 2)
+            ]
+        return make_response(request, records)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tap = tap_factory(stream_concurrency=3)
+
+    tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    for stream in ("products", "orders"):
+        types = [
+            message["type"] for message in messages if message.get("stream") == stream
+        ]
+        assert types == ["SCHEMA", "RECORD", "RECORD"]
+    assert messages[-1]["type"] == "STATE"
+    bookmarks = messages[-1]["value"]["bookmarks"]
+    assert bookmarks["orders"]["replication_key_value"] == "2024-01-02T00:00:00"
+
+
+def test_concurrent_sync_raises_stream_errors(tap_factory, monkeypatch):
+    monkeypatch.setattr(
+        requests.Session,
+        "send",
+        lambda session, request, **kwargs: make_response(request, [], status_code=401),
+    )
+    tap = tap_factory(stream_concurrency=2)
+
+    with pytest.raises(Exception, match="401"):
+        tap.sync_all()
+
+
+def test_stores_are_synced_separately_and_tagged(tap_factory, monkeypatch, capsys):
+    # Store a's products wait for store b to start, which a blocked queue would not.
+    store_b_started = threading.Event()
+    modified_after = {}
+
+    def send(session, request, **kwargs):
+        url = urlparse(request.url)
+        store, path = url.netloc.split(".")[0], url.path.rsplit("/", 1)[-1]
+        modified_after[store, path] = request_params(request).get("modified_after")
+        if store == "b":
+            store_b_started.set()
+        elif path == "products":
+            assert store_b_started.wait(timeout=5)
+        records = []
+        if path in ("products", "orders"):
+            records = [
+                {"id": 1, "refunds": [], "date_modified_gmt": "2024-02-01T00:00:00"}
+            ]
+        return make_response(request, records)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tap = tap_factory(
+        stores=[
+            {"api_url": "https://a.example.com", "start_date": "2024-01-01T00:00:00Z"},
+            {"api_url": "https://b.example.com", "store_id": "shop-b"},
+        ],
+        store_concurrency=2,
+    )
+
+    tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = [message for message in messages if message["type"] == "RECORD"]
+    assert sorted(
+        (message["stream"], message["record"]["store_id"]) for message in records
+    ) == [
+        ("orders", "a.example.com"),
+        ("orders", "shop-b"),
+        ("products", "a.example.com"),
+        ("products", "shop-b"),
+    ]
+    assert modified_after["a", "orders"] == "2024-01-01T00:00:00Z"
+    assert modified_after["b", "orders"] != modified_after["a", "orders"]
+    partitions = messages[-1]["value"]["bookmarks"]["orders"]["partitions"]
+    assert sorted(partition["context"]["store_id"] for partition in partitions) == [
+        "a.example.com",
+        "shop-b",
+    ]
+    assert tap.streams["orders"].primary_keys == ["id", "store_id"]
+
+
+def test_each_store_is_probed_for_bulk_refunds(tap_factory, monkeypatch, capsys):
+    requested_hosts = set()
+
+    def send(session, request, **kwargs):
+        url = urlparse(request.url)
+        requested_hosts.add(url.netloc)
+        bulk = url.path.endswith("/v3/refunds")
+        if bulk and url.netloc != "a.example.com":
+            return make_response(request, [], status_code=404)
+        records = []
+        if url.path.endswith("/orders"):
+            records = [
+                {"id": 1, "refunds": [{"id": 7}], "date_modified_gmt": "2024-02-01"}
+            ]
+        elif url.path.endswith("/refunds"):
+            records = [{"id": 7, "parent_id": 1, "date_created_gmt": "2024-02-01"}]
+            if not bulk:
+                records[0].pop("parent_id")
+        return make_response(request, records)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tap = tap_factory(
+        bulk_refunds=True,
+        start_date="2024-01-01T00:00:00Z",
+        stores=[
+            {"api_url": "https://a.example.com"},
+            {"api_url": "https://b.example.com"},
+        ],
+    )
+
+    tap.sync_all()
+
+    # The top-level `api_url` is never probed, b falls back to per order refunds.
+    assert requested_hosts == {"a.example.com", "b.example.com"}
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    refunds = [
+        message["record"]
+        for message in messages
+        if message["type"] == "RECORD" and message["stream"] == "refunds"
+    ]
+    assert sorted(refund["store_id"] for refund in refunds) == [
+        "a.example.com",
+        "b.example.com",
+    ]
+
+
+def test_interrupted_sync_resumes_from_the_checkpoint(tap_factory, monkeypatch):
+    requested = []
+    fail_on_page = [3]
+
+    def send(session, request, **kwargs):
+        params = request_params(request)
+        page = int(params.get("page", 1))
+        if not urlparse(request.url).path.endswith("/orders"):
+            return make_response(request, [])
+        requested.append((page, params.get("modified_after")))
+        if page == fail_on_page[0]:
+            return make_response(request, [], status_code=401)
+        records = [
+            {
+                "id": i,
+                "refunds": [],
+                "date_modified_gmt": (
+                    "2024-03-01T00:00:00" if i == 5 else "2024-01-01T00:00:00"
+                ),
+            }
+            for i in range((page - 1) * 100, min(page * 100, 250))
+        ]
+        headers = {}
+        if page < 3:
+            headers["Link"] = (
+                f'<https://store.example.com/?page={page + 1}>; rel="next"'
+            )
+        return make_response(request, records, headers)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    config = {"checkpoint_pages": True, "start_date": "2023-12-01T00:00:00Z"}
+    tap = tap_factory(**config)
+    with pytest.raises(Exception, match="401"):
+        tap.sync_all()
+
+    checkpoint = tap.state["bookmarks"]["orders"]["checkpoint"]
+    assert checkpoint == {
+        "params": {"modified_after": "2023-12-01T00:00:00Z"},
+        "page": 3,
+        "replication_key_value": "2024-03-01T00:00:00",
+    }
+
+    requested.clear()
+    fail_on_page[0] = None
+    resumed = tap_factory(**config, state=copy.deepcopy(tap.state))
+    resumed.sync_all()
+
+    assert requested == [(3, "2023-12-01T00:00:00Z")]
+    orders_state = resumed.state["bookmarks"]["orders"]
+    assert "checkpoint" not in orders_state
+    assert orders_state["replication_key_value"] == "2024-03-01T00:00:00"
+
+
+def test_checkpoints_follow_the_records_they_cover(tap_factory, monkeypatch, capsys):
+    def send(session, request, **kwargs):
+        params = request_params(request)
+        path = urlparse(request.url).path
+        if path.endswith("/orders") and "include" in params:
+            order_ids = params["include"].split(",")
+            records = [{"id": int(order_id)} for order_id in order_ids]
+            return make_response(request, records)
+        if not path.endswith("/subscriptions"):
+            return make_response(request, [])
+        page = int(params.get("page", 1))
+        if page == 3:
+            return make_response(request, [], status_code=401)
+        records = [
+            {
+                "id": i,
+                "parent_id": 1000 + i,
+                "date_modified_gmt": "2024-01-01T00:00:00",
+                "meta_data": [
+                    {"key": "_subscription_renewal_order_ids_cache", "value": []}
+                ],
+            }
+            for i in range((page - 1) * 100 + 1, page * 100 + 1)
+        ]
+        headers = {"Link": f'<https://store.example.com/?page={page + 1}>; rel="next"'}
+        return make_response(request, records, headers)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tap = tap_factory(
+        checkpoint_pages=True,
+        subscription_orders_mode="derived",
+        start_date="2023-12-01T00:00:00Z",
+    )
+    with pytest.raises(Exception, match="401"):
+        tap.sync_all()
+
+    # The last checkpoint resumes from page 3, so everything before it is out.
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    states = [message["value"] for message in messages if message["type"] == "STATE"]
+    assert states[-1]["bookmarks"]["subscriptions"]["checkpoint"]["page"] == 3
+    records = Counter(
+        message["stream"] for message in messages if message["type"] == "RECORD"
+    )
+    assert records["subscriptions"] == 200
+    assert records["subscription_orders"] == 200
+
+
+def test_catalog_is_served_from_the_cache(tmp_path, monkeypatch, capsys):
+    from tap_woo import cli
+
+    def discover(**config):
+        # Discovery builds the tap without a mapper, so without streams.
+        config = {**OFFLINE_CONFIG, "catalog_cache_dir": str(tmp_path), **config}
+        return Tapwoo(config=config, validate_config=False, setup_mapper=False)
+
+    catalog = discover().catalog_dict
+    assert len(list(tmp_path.glob("catalog-*.json"))) == 1
+
+    def discover_streams(self):
+        raise AssertionError("Streams should not be discovered.")
+
+    monkeypatch.setattr(Tapwoo, "discover_streams", discover_streams)
+    assert discover().catalog_dict == catalog
+
+    # A setting changing the catalog is discovered again.
+    monkeypatch.setattr(Tapwoo, "_has_related_order_caches", lambda self, stream: True)
+    with pytest.raises(AssertionError):
+        discover(subscription_orders_mode="derived").catalog_dict
+    with pytest.raises(AssertionError):
+        discover(stores=[{"api_url": "https://other.example.com"}]).catalog_dict
+
+    # So is a store starting to expose the refunds listing.
+    monkeypatch.setattr(Tapwoo, "_has_refunds_listing", lambda self, stream: False)
+    assert discover(bulk_refunds=True).catalog_dict == catalog
+    monkeypatch.setattr(Tapwoo, "_has_refunds_listing", lambda self, stream: True)
+    with pytest.raises(AssertionError):
+        discover(bulk_refunds=True).catalog_dict
+
+    # The command line prints the cached catalog without building a tap.
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"catalog_cache_dir": str(tmp_path)}))
+    argv = ["tap-woo", "--config", str(config_path), "--discover"]
+    monkeypatch.setattr("sys.argv", argv)
+    monkeypatch.setattr(Tapwoo, "cli", None)
+    cli.main()
+    assert json.loads(capsys.readouterr().out) == catalog